@@ -1,5 +1,7 @@
 import {Window} from './window.js';
 import {Grid} from './grid.js';
+import {TraceReader} from './trace.js';
+import {TraceWindow} from './trace-window.js';
 
 document.getElementById('example-simple').onclick = () => {
   const grid = new Grid(5, 3);
@@ -57,3 +59,16 @@ document.getElementById('example-narrow').onclick = () => {
 
   new Window(grid, 100);
 };
+
+document.getElementById('trace-file').onchange = (event) => {
+  const file = event.target.files[0];
+  if (file === undefined) {
+    return;
+  }
+
+  const reader = new TraceReader();
+  const traceWindow = new TraceWindow(reader);
+  reader.load(file, () => traceWindow.update()).
+      then(() => traceWindow.update()).
+      catch((error) => console.log(`Could not load trace: ${error}`));
+};
@@ -0,0 +1,227 @@
+import {ROOT_PARENT} from './trace.js';
+
+const COLORS = ['#CC4452', '#246180', '#801D27', '#2F98CC'];
+
+function agentColor(agent) {
+  if (agent < COLORS.length) {
+    return COLORS[agent];
+  }
+
+  return `hsl(${agent * 137 % 360}, 60%, 45%)`;
+}
+
+/**
+ * Shows the expansions of a search from a trace file, picked with a slider
+ * or played back, instead of running the search in the browser.
+ */
+export class TraceWindow {
+
+  constructor(reader) {
+    this.reader = reader;
+    this.search = undefined;
+    this.mapCanvas = undefined;
+    this.playing = false;
+
+    this.speedSlider = document.getElementById('speed-slider');
+    this.stepSlider = document.getElementById('trace-step');
+    this.searchSelect = document.getElementById('trace-search');
+    this.playButton = document.getElementById('btn-play');
+    this.queueSize = document.getElementById('queue-size');
+    this.currentCost = document.getElementById('current-cost');
+    this.nodeInfo = document.getElementById('trace-node');
+
+    this.canvas = document.getElementById('canvas');
+    this.ctx = this.canvas.getContext('2d');
+
+    this.searchSelect.innerHTML = '';
+    this.searchSelect.onchange = () => this.selectSearch(
+        parseInt(this.searchSelect.value));
+    this.stepSlider.oninput = () => this.render();
+    this.playButton.onclick = () => this.togglePlay();
+  }
+
+  /**
+   * Add the searches and expansions read so far, called while loading.
+   */
+  update() {
+    const searches = this.reader.searches;
+    for (let i = this.searchSelect.options.length; i < searches.length;
+         i++) {
+      const option = document.createElement('option');
+      option.value = `${i}`;
+      option.innerText = `Search ${i + 1} (${searches[i].agents} agents)`;
+      this.searchSelect.appendChild(option);
+    }
+
+    if (this.search === undefined && searches.length > 0) {
+      this.selectSearch(0);
+    } else if (this.search !== undefined) {
+      this.stepSlider.max = `${Math.max(this.search.expansions - 1, 0)}`;
+      if (this.stepSlider.value === '0') {
+        this.render();
+      }
+    }
+  }
+
+  selectSearch(index) {
+    this.search = this.reader.searches[index];
+    this.searchSelect.value = `${index}`;
+    this.stepSlider.max = `${Math.max(this.search.expansions - 1, 0)}`;
+    this.stepSlider.value = '0';
+
+    const map = this.search.map;
+    this.cellSize = Math.max(2, Math.floor(2000 / Math.max(map.width,
+        map.height)));
+    this.canvas.width = map.width * this.cellSize;
+    this.canvas.height = map.height * this.cellSize;
+    document.getElementById('canvas-container').style.paddingTop =
+        (map.height / map.width * 100) + '%';
+
+    this.renderMap();
+    this.render();
+  }
+
+  cellCenter(cell) {
+    const width = this.search.map.width;
+    return [
+      (cell % width + 0.5) * this.cellSize,
+      (Math.floor(cell / width) + 0.5) * this.cellSize,
+    ];
+  }
+
+  /**
+   * Draw the walls once per search, as maps can have many cells.
+   */
+  renderMap() {
+    const map = this.search.map;
+    this.mapCanvas = document.createElement('canvas');
+    this.mapCanvas.width = this.canvas.width;
+    this.mapCanvas.height = this.canvas.height;
+    const ctx = this.mapCanvas.getContext('2d');
+
+    ctx.fillStyle = '#F9E4AD';
+    ctx.fillRect(0, 0, this.mapCanvas.width, this.mapCanvas.height);
+    ctx.fillStyle = '#723147';
+    for (let cell = 0; cell < map.walls.length; cell++) {
+      if (map.walls[cell]) {
+        ctx.fillRect(cell % map.width * this.cellSize,
+            Math.floor(cell / map.width) * this.cellSize,
+            this.cellSize, this.cellSize);
+      }
+    }
+  }
+
+  render() {
+    if (this.search === undefined || this.search.expansions === 0) {
+      return;
+    }
+
+    const search = this.search;
+    const expansion = Math.min(parseInt(this.stepSlider.value),
+        search.expansions - 1);
+    const id = search.expanded[expansion];
+
+    this.ctx.drawImage(this.mapCanvas, 0, 0);
+    this.renderTargets(id);
+    this.renderTrail(id);
+
+    const g = search.g[id];
+    const h = search.h[id];
+    this.queueSize.innerText = `${search.queueSize(expansion)}`;
+    this.currentCost.innerText = `${g + h}`;
+    this.nodeInfo.innerText = `#${id}: g = ${g}, h = ${h} ` +
+        `(${expansion + 1} / ${search.expansions})`;
+    if (search.waypoints.some((waypoints) => waypoints.length > 32)) {
+      this.nodeInfo.innerText += ', only the visits of the first 32 ' +
+          'waypoints are shown';
+    }
+  }
+
+  renderTargets(id) {
+    const search = this.search;
+    const size = this.cellSize;
+
+    for (let agent = 0; agent < search.agents; agent++) {
+      this.ctx.strokeStyle = agentColor(agent);
+      this.ctx.fillStyle = agentColor(agent);
+      this.ctx.lineWidth = Math.max(1, size / 20);
+
+      const [gx, gy] = this.cellCenter(search.goals[agent]);
+      this.ctx.beginPath();
+      this.ctx.moveTo(gx - size / 4, gy - size / 4);
+      this.ctx.lineTo(gx + size / 4, gy + size / 4);
+      this.ctx.moveTo(gx + size / 4, gy - size / 4);
+      this.ctx.lineTo(gx - size / 4, gy + size / 4);
+      this.ctx.stroke();
+
+      // Waypoints by visited bit, filled once visited
+      const visited = search.visitedMask(id, agent);
+      search.waypoints[agent].forEach((waypoint, bit) => {
+        const [wx, wy] = this.cellCenter(waypoint);
+        this.ctx.beginPath();
+        this.ctx.rect(wx - size / 4, wy - size / 4, size / 2, size / 2);
+        if (bit >= 32) {
+          return;
+        }
+        if (visited >>> bit & 1) {
+          this.ctx.fill();
+        } else {
+          this.ctx.stroke();
+        }
+      });
+    }
+  }
+
+  /**
+   * Draw the agents at a node and their moves from the root to it.
+   */
+  renderTrail(id) {
+    const search = this.search;
+
+    this.ctx.lineWidth = Math.max(1, this.cellSize / 10);
+    this.ctx.lineCap = 'round';
+
+    for (let agent = 0; agent < search.agents; agent++) {
+      this.ctx.strokeStyle = agentColor(agent);
+      this.ctx.beginPath();
+      let node = id;
+      this.ctx.moveTo(...this.cellCenter(search.position(node, agent)));
+      while (search.parents[node] !== ROOT_PARENT) {
+        node = search.parents[node];
+        this.ctx.lineTo(...this.cellCenter(search.position(node, agent)));
+      }
+      this.ctx.stroke();
+
+      const [x, y] = this.cellCenter(search.position(id, agent));
+      this.ctx.fillStyle = agentColor(agent);
+      this.ctx.beginPath();
+      this.ctx.arc(x, y, this.cellSize / 4, 0, 2 * Math.PI);
+      this.ctx.fill();
+    }
+  }
+
+  togglePlay() {
+    this.playing = !this.playing;
+    this.playButton.innerText = this.playing ? 'Pause' : 'Play';
+    if (this.playing) {
+      this.playNext();
+    }
+  }
+
+  playNext() {
+    if (!this.playing) {
+      return;
+    }
+
+    const step = parseInt(this.stepSlider.value);
+    if (step >= this.search.expansions - 1) {
+      this.togglePlay();
+      return;
+    }
+
+    this.stepSlider.value = `${step + 1}`;
+    this.render();
+    setTimeout(() => this.playNext(), 250 - this.speedSlider.value);
+  }
+
+}
@@ -0,0 +1,291 @@
+// Reader of the binary search traces written by search_trace.py, see there
+// for the format. Files are parsed while they stream in, into typed arrays
+// per search, so any expansion can be shown without redoing the search.
+
+const MAGIC = 'MAPFWTRACE';
+const VERSION = 2;
+
+const SEARCH = 0;
+const EXPAND = 1;
+const SKIP = 2;
+const GENERATE = 3;
+const MAP = 4;
+
+export const ROOT_PARENT = 0xFFFFFFFF;
+
+function grow(array, size) {
+  if (size <= array.length) {
+    return array;
+  }
+
+  const grown = new array.constructor(Math.max(size, array.length * 2));
+  grown.set(array);
+  return grown;
+}
+
+function readUnsigned(view, offset, bytes) {
+  switch (bytes) {
+    case 1:
+      return view.getUint8(offset);
+    case 2:
+      return view.getUint16(offset, true);
+    default:
+      // Only the first 32 waypoints of 8 byte masks are kept, the viewer
+      // says so for those searches
+      return view.getUint32(offset, true);
+  }
+}
+
+export class TraceSearch {
+
+  constructor(map, agents, cellBytes, visitedBytes) {
+    this.map = map;
+    this.agents = agents;
+    this.cellBytes = cellBytes;
+    this.visitedBytes = visitedBytes;
+    this.starts = [];
+    this.goals = [];
+    this.waypoints = [];
+
+    // Generated nodes by id
+    this.nodes = 0;
+    this.parents = new Uint32Array(1024);
+    this.g = new Uint32Array(1024);
+    this.h = new Uint32Array(1024);
+    this.positions = new Uint32Array(1024 * agents);
+    this.visited = new Uint32Array(1024 * agents);
+
+    // Expanded node ids in order, and the number of nodes generated and
+    // popped before each expansion
+    this.expansions = 0;
+    this.expanded = new Uint32Array(1024);
+    this.generatedBefore = new Uint32Array(1024);
+    this.poppedBefore = new Uint32Array(1024);
+    this.popped = 0;
+  }
+
+  get nodeSize() {
+    return 17 + this.agents * (this.cellBytes + this.visitedBytes);
+  }
+
+  addNode(view, offset) {
+    const id = view.getUint32(offset + 1, true);
+    const size = id + 1;
+    this.parents = grow(this.parents, size);
+    this.g = grow(this.g, size);
+    this.h = grow(this.h, size);
+    this.positions = grow(this.positions, size * this.agents);
+    this.visited = grow(this.visited, size * this.agents);
+
+    this.parents[id] = view.getUint32(offset + 5, true);
+    this.g[id] = view.getUint32(offset + 9, true);
+    this.h[id] = view.getUint32(offset + 13, true);
+
+    let fieldOffset = offset + 17;
+    for (let agent = 0; agent < this.agents; agent++) {
+      this.positions[id * this.agents + agent] =
+          readUnsigned(view, fieldOffset, this.cellBytes);
+      fieldOffset += this.cellBytes;
+    }
+    for (let agent = 0; agent < this.agents; agent++) {
+      this.visited[id * this.agents + agent] =
+          readUnsigned(view, fieldOffset, this.visitedBytes);
+      fieldOffset += this.visitedBytes;
+    }
+
+    this.nodes = Math.max(this.nodes, size);
+  }
+
+  addExpansion(id) {
+    const size = this.expansions + 1;
+    this.expanded = grow(this.expanded, size);
+    this.generatedBefore = grow(this.generatedBefore, size);
+    this.poppedBefore = grow(this.poppedBefore, size);
+
+    this.expanded[this.expansions] = id;
+    this.generatedBefore[this.expansions] = this.nodes;
+    this.poppedBefore[this.expansions] = this.popped;
+    this.expansions++;
+    this.popped++;
+  }
+
+  position(id, agent) {
+    return this.positions[id * this.agents + agent];
+  }
+
+  visitedMask(id, agent) {
+    return this.visited[id * this.agents + agent];
+  }
+
+  queueSize(expansion) {
+    return this.generatedBefore[expansion] - this.poppedBefore[expansion];
+  }
+
+}
+
+export class TraceReader {
+
+  constructor() {
+    this.searches = [];
+    this.map = undefined;
+    this.headerRead = false;
+    this.bytesRead = 0;
+  }
+
+  get lastSearch() {
+    return this.searches[this.searches.length - 1];
+  }
+
+  /**
+   * Read a trace file chunk by chunk.
+   * @param file Blob of the trace
+   * @param onProgress Called with the reader after every chunk
+   */
+  async load(file, onProgress) {
+    const stream = file.stream().getReader();
+    let pending = new Uint8Array(0);
+
+    for (;;) {
+      const {done, value} = await stream.read();
+      if (done) {
+        break;
+      }
+
+      let data = value;
+      if (pending.length > 0) {
+        data = new Uint8Array(pending.length + value.length);
+        data.set(pending);
+        data.set(value, pending.length);
+      }
+
+      const used = this.parse(data);
+      pending = data.slice(used);
+      this.bytesRead += used;
+      onProgress(this);
+    }
+
+    if (pending.length > 0) {
+      throw new Error('Trace ends in the middle of a record');
+    }
+  }
+
+  /**
+   * Parse the complete records at the start of the data.
+   * @return Number of bytes parsed
+   */
+  parse(data) {
+    const view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+    let offset = 0;
+
+    if (!this.headerRead) {
+      if (data.length < MAGIC.length + 1) {
+        return 0;
+      }
+      const magic = String.fromCharCode(...data.subarray(0, MAGIC.length));
+      if (magic !== MAGIC || data[MAGIC.length] !== VERSION) {
+        throw new Error(`Not a version ${VERSION} trace file`);
+      }
+      this.headerRead = true;
+      offset = MAGIC.length + 1;
+    }
+
+    while (offset < data.length) {
+      const size = this.recordSize(view, offset);
+      if (size === undefined || offset + size > data.length) {
+        break;
+      }
+
+      this.parseRecord(view, offset);
+      offset += size;
+    }
+
+    return offset;
+  }
+
+  /**
+   * Size of the record at an offset, undefined if too little is read to
+   * tell.
+   */
+  recordSize(view, offset) {
+    const available = view.byteLength - offset;
+
+    switch (view.getUint8(offset)) {
+      case MAP: {
+        if (available < 5) {
+          return undefined;
+        }
+        const cells = view.getUint16(offset + 1, true) *
+            view.getUint16(offset + 3, true);
+        return 5 + Math.ceil(cells / 8);
+      }
+      case SEARCH: {
+        if (available < 5) {
+          return undefined;
+        }
+        let size = 5;
+        for (let agent = 0; agent < view.getUint16(offset + 1, true);
+             agent++) {
+          if (available < size + 10) {
+            return undefined;
+          }
+          size += 10 + 4 * view.getUint16(offset + size + 8, true);
+        }
+        return size;
+      }
+      case EXPAND:
+      case SKIP:
+        return 5;
+      case GENERATE:
+        return this.lastSearch.nodeSize;
+      default:
+        throw new Error(`Unknown record kind at byte ${this.bytesRead +
+            offset}`);
+    }
+  }
+
+  parseRecord(view, offset) {
+    switch (view.getUint8(offset)) {
+      case MAP: {
+        const width = view.getUint16(offset + 1, true);
+        const height = view.getUint16(offset + 3, true);
+        const walls = new Uint8Array(width * height);
+        for (let cell = 0; cell < walls.length; cell++) {
+          walls[cell] = view.getUint8(offset + 5 + (cell >> 3)) >>
+              (cell & 7) & 1;
+        }
+        this.map = {width, height, walls};
+        break;
+      }
+      case SEARCH: {
+        const agents = view.getUint16(offset + 1, true);
+        const search = new TraceSearch(this.map, agents,
+            view.getUint8(offset + 3), view.getUint8(offset + 4));
+        let fieldOffset = offset + 5;
+        for (let agent = 0; agent < agents; agent++) {
+          search.starts.push(view.getUint32(fieldOffset, true));
+          search.goals.push(view.getUint32(fieldOffset + 4, true));
+          const count = view.getUint16(fieldOffset + 8, true);
+          fieldOffset += 10;
+          const waypoints = [];
+          for (let i = 0; i < count; i++) {
+            waypoints.push(view.getUint32(fieldOffset, true));
+            fieldOffset += 4;
+          }
+          search.waypoints.push(waypoints);
+        }
+        this.searches.push(search);
+        break;
+      }
+      case EXPAND:
+        this.lastSearch.addExpansion(view.getUint32(offset + 1, true));
+        break;
+      case SKIP:
+        this.lastSearch.popped++;
+        break;
+      case GENERATE:
+        this.lastSearch.addNode(view, offset);
+        break;
+    }
+  }
+
+}
@@ -0,0 +1,221 @@
+"""
+Reproducible benchmarks: families of seeded instances are written to a
+versioned suite file once, and every run solves exactly those instances and
+reports the phases and search counters per instance as JSON, so the reports
+of different versions can be compared.
+"""
+import json
+import multiprocessing
+import os
+import random
+import resource
+import time
+from typing import Dict, List, Optional
+
+import click
+
+import solver
+from grid import Grid
+from progressive import save_generate_grid
+
+# Version of the instances, increase when changing the families or the
+# generator, so reports of different instances are never compared
+SUITE_VERSION = 1
+
+# Instance families as (size, agents, waypoints, infill percentage)
+FAMILIES = [
+    (8, 2, 2, 20),
+    (8, 3, 1, 20),
+    (10, 4, 2, 20),
+    (12, 3, 4, 20),
+    (12, 5, 1, 10),
+    (16, 4, 3, 30),
+    (16, 6, 2, 20),
+    (32, 8, 1, 20),
+]
+
+INSTANCES_PER_FAMILY = 5
+
+
+def suite_file(version: int = SUITE_VERSION) -> str:
+    return os.path.join("benchmarks", f"suite_v{version}.json")
+
+
+def generate_suite(seed: int = 0) -> Dict:
+    instances = []
+    for size, agents, waypoints, infill in FAMILIES:
+        name = f"{size}x{size}_{infill}%_{agents}a_{waypoints}w"
+        for index in range(INSTANCES_PER_FAMILY):
+            rng = random.Random(f"{seed}/{name}/{index}")
+            grid = save_generate_grid(agents, waypoints, size, infill, rng)
+            instances.append({
+                "name": f"{name}_{index}",
+                "size": size,
+                "agents": agents,
+                "waypoints": waypoints,
+                "infill": infill,
+                "grid": grid.data(),
+            })
+
+    return {
+        "version": SUITE_VERSION,
+        "seed": seed,
+        "instances": instances,
+    }
+
+
+def run_instance(grid_data, options, timers: bool) -> Dict:
+    """
+    Solve one instance, meant to run in a fresh process so the peak memory
+    is its own.
+    """
+
+    grid = Grid.from_data(grid_data)
+    grid.options.update(options)
+
+    start_time = time.time()
+    solution, stats = solver.solve_with_stats(grid, timers=timers)
+    total_time = time.time() - start_time
+
+    result = stats.to_dict()
+    result["time"] = total_time
+    if solution is None:
+        result["failed"] = True
+    else:
+        result["cost"] = sum(len(path.unpadded()) - 1
+                             for path in solution.paths)
+    # Kilobytes on Linux
+    result["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return result
+
+
+def run_suite(suite: Dict, options, timeout: float,
+              timers: bool = False) -> List[Dict]:
+    results = []
+    for instance in suite["instances"]:
+        print(f"{instance['name']:<28}", end="", flush=True)
+
+        pool = multiprocessing.Pool(1)
+        try:
+            result = pool.apply_async(run_instance, (
+                instance["grid"], options, timers)).get(timeout)
+            print(f"{round(result['time'], 3)} sec"
+                  f"{', no solution' if 'failed' in result else ''}")
+        except multiprocessing.TimeoutError:
+            result = {"timeout": True}
+            print("timeout")
+        except Exception as error:
+            result = {"error": repr(error)}
+            print(f"error: {error!r}")
+        finally:
+            pool.terminate()
+
+        result["name"] = instance["name"]
+        results.append(result)
+
+    return results
+
+
+def compare(old: Dict, new: Dict):
+    """
+    Print the time of each instance in a new report relative to an old one,
+    and flag different costs, which mean a bug in either version.
+    """
+
+    old_results = {result["name"]: result for result in old["results"]}
+    for result in new["results"]:
+        old_result: Optional[Dict] = old_results.get(result["name"])
+        if old_result is None or "timeout" in old_result or \
+                "timeout" in result:
+            continue
+
+        failed = [report for report, report_result in
+                  [("old", old_result), ("new", result)]
+                  if "failed" in report_result or "error" in report_result]
+        if failed:
+            print(f"{result['name']:<28} FAILED in {' and '.join(failed)}")
+            continue
+
+        ratio = result["time"] / max(old_result["time"], 1e-6)
+        flag = "" if result["cost"] == old_result["cost"] else \
+            f" COST {old_result['cost']} -> {result['cost']}"
+        print(f"{result['name']:<28}{round(old_result['time'], 3):>9} "
+              f"{round(result['time'], 3):>9} x{round(ratio, 2)}{flag}")
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option('--seed', default=0, help="Seed of all the instances.")
+def generate(seed):
+    """
+    Write the suite file of the current version.
+    """
+
+    os.makedirs("benchmarks", exist_ok=True)
+    with open(suite_file(), "w") as file:
+        json.dump(generate_suite(seed), file)
+
+
+@cli.command()
+@click.option('--options', default="{}",
+              help="Solver options as JSON, on top of the grid defaults.")
+@click.option('--timeout', default=60, help="Seconds per instance.")
+@click.option('--timers', is_flag=True,
+              help="Also time the heuristic, expansions and open list, "
+                   "which slows down the search.")
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help="Report file, by default in the reports directory.")
+def run(options, timeout, timers, output):
+    """
+    Run the suite and write a JSON report.
+    """
+
+    with open(suite_file(), "r") as file:
+        suite = json.load(file)
+
+    options = json.loads(options)
+
+    if output is None:
+        os.makedirs("reports", exist_ok=True)
+        label = time.strftime("%Y%m%d_%H%M%S")
+        output = os.path.join("reports", f"benchmark_{label}.json")
+
+    # A temporary file next to the output is created first, so a bad path
+    # fails before running, and an existing report is only replaced by a
+    # complete one
+    temporary_output = f"{output}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_output, "w") as file:
+            report = {
+                "suite_version": suite["version"],
+                "options": options,
+                "timers": timers,
+                "results": run_suite(suite, options, timeout, timers),
+            }
+            json.dump(report, file, indent=1)
+        os.replace(temporary_output, output)
+    finally:
+        if os.path.exists(temporary_output):
+            os.remove(temporary_output)
+
+
+@cli.command("compare")
+@click.argument('old_report', type=click.File())
+@click.argument('new_report', type=click.File())
+def compare_command(old_report, new_report):
+    """
+    Compare the times and costs of two reports.
+    """
+
+    old, new = json.load(old_report), json.load(new_report)
+    assert old["suite_version"] == new["suite_version"], "Same instances"
+    compare(old, new)
+
+
+if __name__ == "__main__":
+    cli()
@@ -2,9 +2,12 @@
 Class for running benchmarks in bulk on some server. Results can be obtained
 from multiple sources, and the running can be stopped at any time.
 """
+import itertools
 import time
-from multiprocessing import Process, cpu_count, SimpleQueue, Lock
+from multiprocessing import Process, cpu_count, Queue
 import os
+from queue import Empty
+from typing import Dict, Tuple
 
 from func_timeout import func_timeout, FunctionTimedOut
 from git import Repo
@@ -12,101 +15,161 @@ from git import Repo
 from database import Database
 from grid import Grid
 from progressive import run_single
+from solver import SOLVERS
+from stats import SolveStats
 
+# Seconds per run before it counts as a timeout
+TIME_LIMIT = 100
 
-def parse_grid(grid_data) -> Grid:
-    grid = Grid(grid_data["width"], grid_data["height"])
+INFILL = 20
+
+# Grids fetched ahead per worker
+PREFETCH = 2
 
-    for y in range(grid.h):
-        for x in range(grid.w):
-            if grid_data["walls"][y][x]:
-                grid.add_wall(x, y)
+# Finished runs are committed together, when there are this many or when
+# the last commit is this many seconds ago
+COMMIT_RUNS = 32
+COMMIT_INTERVAL = 5
 
-    for start, goal in zip(grid_data["starts"], grid_data["goals"]):
-        grid.add_agent(tuple(start), tuple(goal))
 
-    for agent, waypoints in enumerate(grid_data["waypoints"]):
-        for x, y in waypoints:
-            grid.add_waypoint(agent, x, y)
+def parse_grid(grid_data) -> Grid:
+    return Grid.from_data(grid_data)
 
-    return grid
 
+def run_single_from_data(grid_data, solver_name: str) \
+        -> Tuple[float, Dict]:
+    """
+    :return: the run time of the search, and its stats without the timers
+    """
 
-def run_single_from_data(grid_data) -> float:
-    return run_single(parse_grid(grid_data))
+    grid = parse_grid(grid_data)
+    grid.stats = SolveStats()
+    runtime = run_single(grid, SOLVERS[solver_name])
+    return runtime, grid.stats.to_dict()
 
 
-def work(version_id, computer_id, index, size, busy_queue: SimpleQueue,
-         result_queue: SimpleQueue,
-         db: Database):
-    time_limit = 100
-    while True:
-        agents, waypoints = busy_queue.get()
+def work(index, solver_name: str, task_queue: Queue, result_queue: Queue):
+    """
+    Solve the grids of the task queue until it gives None, without touching
+    the database.
+    """
 
+    while True:
         start_time = time.time()
-        run_id, grid_data = db.get_grid(version_id, computer_id, index,
-                                        time_limit, agents, waypoints, size,
-                                        20)
-        overhead = time.time() - start_time
+        task = task_queue.get()
+        wait = time.time() - start_time
+        if task is None:
+            return
 
+        grid_id, grid_data, combination = task
         res = None
+        stats = None
         error = None
 
         try:
-            res = func_timeout(time_limit, run_single_from_data,
-                               args=(grid_data,))
+            res, stats = func_timeout(TIME_LIMIT, run_single_from_data,
+                                      args=(grid_data, solver_name))
         except FunctionTimedOut:
             pass
         except Exception as e:
             error = e
 
-        result_queue.put((index, run_id, res, error, overhead))
-        busy_queue.put((agents, waypoints))
+        result_queue.put((index, grid_id, combination, res, stats, error,
+                          wait))
+
 
+def run_bulk(version_name, computer_name, size, agent_range, waypoint_range,
+             solver_name="id"):
+    """
+    Run the combinations of agents and waypoints in turn on worker
+    processes. This process is the only one using the database: it fetches
+    the grids ahead for the workers, and stores the results in batches.
+    """
 
-def run_bulk(version_name, computer_name, size, agent_range, waypoint_range):
     thread_number = thread_count()
     db = Database()
 
     version_id = db.get_version_id(version_name)
     computer_id = db.get_computer_id(computer_name)
 
-    busy_queue = SimpleQueue()
-    result_queue = SimpleQueue()
+    # All combinations within range
+    combinations = [(agents, waypoints)
+                    for agents in range(max(agent_range[0], 1),
+                                        agent_range[1] + 1)
+                    for waypoints in range(waypoint_range[0],
+                                           waypoint_range[1] + 1)]
+    if not combinations:
+        return
+    combinations = itertools.cycle(combinations)
+
+    task_queue = Queue()
+    result_queue = Queue()
 
-    # Populate with all combinations within range
-    for agents in range(agent_range[0], agent_range[1] + 1):
-        for waypoints in range(waypoint_range[0], waypoint_range[1] + 1):
-            if agents < 1:
-                continue
-            busy_queue.put((agents, waypoints))
+    # Grids given to the workers, not to be fetched again until their run
+    # is stored
+    running = set()
 
-    workers = [Process(target=work, args=(version_id, computer_id, i, size,
-                                          busy_queue, result_queue, db))
+    def put_task():
+        agents, waypoints = next(combinations)
+        grid_id, grid_data = db.get_grid(version_id, computer_id, agents,
+                                         waypoints, size, INFILL, running)
+        running.add(grid_id)
+        task_queue.put((grid_id, grid_data, (agents, waypoints)))
+
+    for _ in range(thread_number * PREFETCH):
+        put_task()
+
+    workers = [Process(target=work, args=(i, solver_name, task_queue,
+                                          result_queue))
                for i in range(thread_number)]
 
     for worker in workers:
         worker.start()
 
     runs = 0
-    while True:
-        thread_index, run_id, runtime, error, overhead = result_queue.get()
-        start_time = time.time()
-        db.complete_run(run_id, runtime)
-        grid_info = db.grid_info(run_id)
-        overhead += time.time() - start_time
-
-        runs += 1
-
-        print(f"[Process {thread_index}] Benchmark #{runs} on "
-              f"{grid_info} ", end="")
-        if runtime is not None:
-            print(f"in {round(runtime,2)} sec", end="")
-        else:
-            print("timeout", end="")
-        print(f" WITH ERROR: {error}" if error is not None else "", end="")
-
-        print(f" (OH {round(overhead * 1000)} ms)")
+    unsaved = 0
+    last_commit = time.time()
+    try:
+        while True:
+            try:
+                thread_index, grid_id, (agents, waypoints), runtime, stats, \
+                    error, overhead = result_queue.get(timeout=COMMIT_INTERVAL)
+            except Empty:
+                thread_index = None
+
+            if thread_index is not None:
+                start_time = time.time()
+                db.add_run(version_id, grid_id, computer_id, thread_index,
+                           TIME_LIMIT, runtime, stats)
+                running.remove(grid_id)
+                unsaved += 1
+                put_task()
+                overhead += time.time() - start_time
+
+                runs += 1
+
+                print(f"[Process {thread_index}] Benchmark #{runs} on "
+                      f"Grid({size}x{size} {INFILL}% {agents}A {waypoints}W) ",
+                      end="")
+                if runtime is not None:
+                    print(f"in {round(runtime,2)} sec", end="")
+                else:
+                    print("timeout", end="")
+                print(f" WITH ERROR: {error}" if error is not None else "",
+                      end="")
+
+                print(f" (OH {round(overhead * 1000)} ms)")
+
+            if unsaved >= COMMIT_RUNS or unsaved and \
+                    time.time() - last_commit >= COMMIT_INTERVAL:
+                db.commit()
+                unsaved = 0
+                last_commit = time.time()
+    finally:
+        # Keep the finished runs when stopped
+        db.commit()
+        for worker in workers:
+            worker.terminate()
 
 
 def thread_count():
@@ -144,7 +207,12 @@ if __name__ == "__main__":
     min_waypoints = int(input("Min # waypoints [0]: ") or 0)
     max_waypoints = int(input("Max # waypoints [10]: ") or 10)
     grid_size = int(input("Grid size [16]: ") or 16)
+    solver_name = input("Solver, id or cbs [id]: ") or "id"
+    assert solver_name in SOLVERS, "Valid solver"
+
+    # Results of other solvers are stored as a separate version
+    version = head_hex if solver_name == "id" else f"{head_hex} ({solver_name})"
 
-    run_bulk(head_hex, computer_label, grid_size,
+    run_bulk(version, computer_label, grid_size,
              (min_agents, max_agents),
-             (min_waypoints, max_waypoints))
+             (min_waypoints, max_waypoints), solver_name)
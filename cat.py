@@ -1,15 +1,24 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
+from edge import edge
 from group import Group
+from pathset import PathSet, Reservations
 
 
 class CAT:
+    """
+    Conflict avoidance table, holding for every (time, cell) and (time, edge)
+    pair the groups whose solutions use it.
+    """
 
     def __init__(self, agents: int, groups: List[Group]):
         self.agents = agents
         self.groups = groups
         self.agent_map: Dict[int, Group] = dict()
-        self.map_agents()
+        self.vertices: Dict[Tuple[int, int], List[Group]] = dict()
+        self.edges: Dict[Tuple[int, int], List[Group]] = dict()
+        self.reserved: Dict[Group, Tuple[PathSet, Reservations]] = dict()
+        self.update(groups)
 
     def map_agents(self):
         """
@@ -21,19 +30,49 @@ class CAT:
 
     def update(self, groups: List[Group]):
         """
-        Update the CAT with new group solutions.
+        Update the CAT with new group solutions. Only the groups that were
+        removed, added or got a new solution change the table.
         """
 
         self.groups = groups
         self.map_agents()
 
+        for group, (solution, _) in list(self.reserved.items()):
+            if group not in groups or group.solution is not solution:
+                self.unreserve(group)
+
+        for group in groups:
+            if group not in self.reserved and group.solution is not None:
+                self.reserve(group)
+
+    def reserve(self, group: Group):
+        reservations = group.solution.reservation_table()
+        vertices, edges = reservations
+        for key in vertices:
+            self.vertices.setdefault(key, []).append(group)
+        for key in edges:
+            self.edges.setdefault(key, []).append(group)
+        self.reserved[group] = group.solution, reservations
+
+    def unreserve(self, group: Group):
+        _, (vertices, edges) = self.reserved.pop(group)
+        for key in vertices:
+            self.vertices[key].remove(group)
+            if not self.vertices[key]:
+                del self.vertices[key]
+        for key in edges:
+            self.edges[key].remove(group)
+            if not self.edges[key]:
+                del self.edges[key]
+
     def conflicts(self, group: Group, from_time, move_from, move_to) -> bool:
-        other_groups = (g for g in self.groups if g != group)
-        for other_group in other_groups:
-            assert other_group.solution is not None, "Groups are solved"
+        for other_group in self.vertices.get((from_time + 1, move_to), ()):
+            if other_group is not group:
+                return True
 
-            if not other_group.solution.move_possible(from_time, move_from,
-                                                      move_to):
+        for other_group in self.edges.get((from_time,
+                                           edge(move_from, move_to)), ()):
+            if other_group is not group:
                 return True
 
         return False
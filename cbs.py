@@ -0,0 +1,220 @@
+"""
+Conflict-Based Search: agents are planned on their own, and conflicts between
+their paths are resolved by branching on a constraint for either agent. The
+low level is a space-time A* over the cells and visited waypoints, using the
+same heuristics and waypoint rules as the A*+OD+ID solver.
+"""
+import time
+from collections import deque
+from typing import FrozenSet, List, Optional, Tuple
+
+import logger
+from conflict_index import Conflict, ConflictIndex
+from edge import edge
+from open_list import OPEN_LISTS
+from path import Path
+from pathset import PathSet
+
+# Per agent the (time, cell) pairs it may not enter, and the (time, edge)
+# pairs it may not start taking
+Constraints = Tuple[FrozenSet[Tuple[int, int]], FrozenSet[Tuple[int, int]]]
+
+NO_CONSTRAINTS: Constraints = frozenset(), frozenset()
+
+
+def plan_agent(grid, agent: int, constraints: Constraints) -> Optional[Path]:
+    """
+    Shortest path of an agent through all its waypoints to its goal, where
+    it stays, that respects its constraints. None if there is none.
+    """
+
+    solve_stats = grid.stats
+    if solve_stats is None:
+        return search_agent(grid, agent, constraints, None)
+
+    start_time = time.perf_counter()
+    try:
+        return search_agent(grid, agent, constraints, solve_stats)
+    finally:
+        solve_stats.searches += 1
+        solve_stats.search_time += time.perf_counter() - start_time
+        solve_stats.max_group_size = max(solve_stats.max_group_size, 1)
+
+
+def search_agent(grid, agent: int, constraints: Constraints,
+                 solve_stats) -> Optional[Path]:
+    """
+    The search of plan_agent, counting its nodes in the stats if given.
+    """
+
+    vertex_constraints, edge_constraints = constraints
+    goal = grid.goals[agent]
+    full_mask = grid.waypoints[agent].full_mask
+
+    # Once past the last constraint the time no longer matters
+    last_constraint = max([t for t, _ in vertex_constraints] +
+                          [t + 1 for t, _ in edge_constraints], default=0)
+    last_goal_constraint = max((t for t, cell in vertex_constraints
+                                if cell == goal), default=-1)
+
+    open_nodes = OPEN_LISTS[grid.options["queue"]]()
+    if solve_stats is not None:
+        open_nodes = solve_stats.instrument(grid, open_nodes)
+    node_id = 0
+    start = grid.starts[agent]
+    h = grid.heuristic(agent, start, 0)
+    open_nodes.push((h, h, 0, node_id, (start, 0, 0, None)))
+    node_id += 1
+
+    closed = set()
+
+    while open_nodes:
+        if solve_stats is not None and \
+                len(open_nodes) > solve_stats.peak_open:
+            solve_stats.peak_open = len(open_nodes)
+
+        _, _, _, _, node = open_nodes.pop()
+        position, visited, t, _ = node
+
+        state = position, visited, min(t, last_constraint + 1)
+        if state in closed:
+            if solve_stats is not None:
+                solve_stats.duplicates += 1
+            continue
+        closed.add(state)
+        if solve_stats is not None:
+            solve_stats.expanded += 1
+
+        if position == goal and visited == full_mask and \
+                t > last_goal_constraint:
+            path = Path(deque())
+            while node is not None:
+                path.prepend_position(node[0])
+                node = node[3]
+            return path
+
+        for neighbour in grid.valid_neighbours(position):
+            if (t + 1, neighbour) in vertex_constraints or \
+                    (t, edge(position, neighbour)) in edge_constraints:
+                continue
+
+            new_visited = visited | grid.visitable_waypoint_bit(
+                agent, neighbour, visited)
+            h = grid.heuristic(agent, neighbour, new_visited)
+            open_nodes.push((t + 1 + h, h, 0, node_id,
+                             (neighbour, new_visited, t + 1, node)))
+            node_id += 1
+            if solve_stats is not None:
+                solve_stats.generated += 1
+
+    return None
+
+
+def path_cost(path: Path) -> int:
+    """
+    Cost of a path, where waiting at the end is free.
+    """
+
+    return len(path.unpadded()) - 1
+
+
+def conflict_constraints(paths: List[List[int]], conflict: Conflict) \
+        -> List[Tuple[int, Tuple[str, Tuple[int, int]]]]:
+    """
+    The constraint for each agent of a conflict that avoids it, as
+    (agent, (kind, (time, cell or edge))).
+    """
+
+    kind, t, agent_a, agent_b = conflict
+    path_a = paths[agent_a]
+
+    if kind == 0:
+        # Agents stay at their last position after their path ends
+        cell = path_a[min(t, len(path_a) - 1)]
+        return [(agent_a, ("vertex", (t, cell))),
+                (agent_b, ("vertex", (t, cell)))]
+
+    taken_edge = edge(path_a[t], path_a[t + 1])
+    return [(agent_a, ("edge", (t, taken_edge))),
+            (agent_b, ("edge", (t, taken_edge)))]
+
+
+def solve_cbs(grid) -> Optional[PathSet]:
+    """
+    Solves the MAPFW problem with Conflict-Based Search. High level nodes are
+    expanded by lowest sum of costs, then fewest conflicts.
+    :return: PathSet solution, or None if there is none
+    """
+
+    start_time = time.time()
+    grid.prepare()
+    setup_time = time.time() - start_time
+    logger.info(f"Setup took {setup_time:.3f} sec")
+    if grid.stats is not None:
+        grid.stats.setup_time += setup_time
+    start_time = time.time()
+
+    constraints = [NO_CONSTRAINTS] * grid.agents
+    paths = [plan_agent(grid, agent, NO_CONSTRAINTS)
+             for agent in range(grid.agents)]
+    if None in paths:
+        return None
+
+    open_nodes = OPEN_LISTS[grid.options["queue"]]()
+    node_id = 0
+    cost = sum(path_cost(path) for path in paths)
+    open_nodes.push((cost, 0, 0, node_id, (constraints, paths)))
+    node_id += 1
+
+    expanded = 0
+    while open_nodes:
+        cost, _, _, _, (constraints, paths) = open_nodes.pop()
+        expanded += 1
+        if grid.stats is not None:
+            grid.stats.high_level_nodes += 1
+
+        index = ConflictIndex()
+        for agent, path in enumerate(paths):
+            index.add_path(agent, list(path))
+
+        conflict = index.first_conflict()
+        if conflict is None:
+            logger.info(f"CBS expanded {expanded} nodes, search took "
+                        f"{time.time() - start_time:.3f} sec")
+            solution = PathSet(grid.agents)
+            solution.paths = [path.copy() for path in paths]
+            solution.pad()
+            return solution
+
+        agent_paths = [index.paths[agent] for agent in range(grid.agents)]
+        for agent, (kind, constraint) in conflict_constraints(agent_paths,
+                                                               conflict):
+            vertex_constraints, edge_constraints = constraints[agent]
+            if kind == "vertex":
+                vertex_constraints = vertex_constraints | {constraint}
+            else:
+                edge_constraints = edge_constraints | {constraint}
+
+            new_path = plan_agent(grid, agent,
+                                  (vertex_constraints, edge_constraints))
+            if new_path is None:
+                continue
+
+            new_constraints = constraints[:]
+            new_constraints[agent] = vertex_constraints, edge_constraints
+            new_paths = paths[:]
+            new_paths[agent] = new_path
+
+            # Count the conflicts of the child in the index of this node
+            index.remove_path(agent)
+            index.add_path(agent, list(new_path))
+            new_conflicts = len(index.conflicts)
+            index.remove_path(agent)
+            index.add_path(agent, agent_paths[agent])
+
+            new_cost = cost - path_cost(paths[agent]) + path_cost(new_path)
+            open_nodes.push((new_cost, new_conflicts, 0, node_id,
+                             (new_constraints, new_paths)))
+            node_id += 1
+
+    logger.info("They never made it...")
@@ -0,0 +1,122 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Set, Tuple
+
+from edge import edge
+
+# (kind, time, agent, other agent), where kind 0 is a vertex conflict and
+# kind 1 an edge conflict, and the agent is the lowest of the two
+Conflict = Tuple[int, int, int, int]
+
+
+class ConflictIndex:
+    """
+    Persistent index of the cells and edges taken by every agent at every
+    time, to find the conflicts between paths without comparing all pairs.
+    As in a merged PathSet, agents stay at their last position after their
+    path ends.
+    """
+
+    def __init__(self):
+        self.paths: Dict[int, List[int]] = dict()
+        self.vertices: Dict[Tuple[int, int], List[int]] = dict()
+        self.edges: Dict[Tuple[int, int], List[int]] = dict()
+        self.parked: Dict[int, List[Tuple[int, int]]] = dict()
+        self.conflicts: Set[Conflict] = set()
+        self.agent_conflicts: Dict[int, Set[Conflict]] = dict()
+        self.indexed: Dict[object, object] = dict()
+
+    def update(self, groups):
+        """
+        Re-index the paths of the groups that were added or got a new
+        solution since the last update, and drop the groups that are gone.
+        """
+
+        for group, solution in list(self.indexed.items()):
+            if group not in groups or group.solution is not solution:
+                for agent in group.agents:
+                    self.remove_path(agent)
+                del self.indexed[group]
+
+        for group in groups:
+            if group not in self.indexed:
+                for index, agent in enumerate(group.agents):
+                    self.add_path(agent, list(group.solution.paths[index]))
+                self.indexed[group] = group.solution
+
+    def length(self) -> int:
+        return max((len(path) for path in self.paths.values()), default=0)
+
+    def _record(self, kind: int, time: int, agent: int, other_agent: int):
+        conflict = kind, time, min(agent, other_agent), max(agent,
+                                                              other_agent)
+        self.conflicts.add(conflict)
+        self.agent_conflicts[agent].add(conflict)
+        self.agent_conflicts[other_agent].add(conflict)
+
+    def add_path(self, agent: int, path: List[int]):
+        assert agent not in self.paths, "Remove the old path first"
+
+        self.paths[agent] = path
+        self.agent_conflicts[agent] = set()
+
+        for time, cell in enumerate(path):
+            key = time, cell
+            for other_agent in self.vertices.get(key, ()):
+                self._record(0, time, agent, other_agent)
+            for parked_from, other_agent in self.parked.get(cell, ()):
+                if parked_from < time:
+                    self._record(0, time, agent, other_agent)
+            self.vertices.setdefault(key, []).append(agent)
+
+        # Only swaps are edge conflicts: moving along together or waiting
+        # in the same cell are vertex conflicts already
+        for time in range(len(path) - 1):
+            if path[time] == path[time + 1]:
+                continue
+            key = time, edge(path[time], path[time + 1])
+            for other_agent in self.edges.get(key, ()):
+                if self.paths[other_agent][time] == path[time + 1]:
+                    self._record(1, time, agent, other_agent)
+            self.edges.setdefault(key, []).append(agent)
+
+        # Others passing the last position after this agent got there
+        last = len(path) - 1
+        for time in range(last + 1, self.length()):
+            for other_agent in self.vertices.get((time, path[last]), ()):
+                self._record(0, time, agent, other_agent)
+        self.parked.setdefault(path[last], []).append((last, agent))
+
+    def remove_path(self, agent: int):
+        path = self.paths.pop(agent)
+
+        for time, cell in enumerate(path):
+            self._unlist(self.vertices, (time, cell), agent)
+        for time in range(len(path) - 1):
+            if path[time] != path[time + 1]:
+                self._unlist(self.edges,
+                             (time, edge(path[time], path[time + 1])), agent)
+        self._unlist(self.parked, path[-1], (len(path) - 1, agent))
+
+        for conflict in self.agent_conflicts.pop(agent):
+            self.conflicts.discard(conflict)
+            _, _, first, second = conflict
+            other_agent = second if first == agent else first
+            if other_agent in self.agent_conflicts:
+                self.agent_conflicts[other_agent].discard(conflict)
+
+    @staticmethod
+    def _unlist(table: Dict, key, value):
+        table[key].remove(value)
+        if not table[key]:
+            del table[key]
+
+    def first_conflict(self) -> Optional[Conflict]:
+        """
+        The conflict a simulation of all paths runs into first: any vertex
+        conflict before edge conflicts, then by time and agents.
+        """
+
+        if not self.conflicts:
+            return None
+
+        return min(self.conflicts)
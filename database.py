@@ -1,28 +1,38 @@
 import json
 import sqlite3
-from multiprocessing import Lock
+from typing import Collection, Dict, Tuple
 
-from grid import Grid
 from progressive import save_generate_grid
 
 
 class Database:
     """
-    Multiprocessing-safe access to the runs database.
+    Access to the runs database. Only one process should write to it, see
+    bulk.run_bulk. Writes of runs are only committed by commit, so they can
+    be batched in a single transaction.
     """
 
-    def __init__(self):
-        self.lock = Lock()
-        self.conn = sqlite3.connect("runs.sqlite")
+    def __init__(self, path="runs.sqlite"):
+        self.conn = sqlite3.connect(path)
         self.conn.executescript(open("db_schema.sql", "r").read())
+
+        # Readers don't block the writer, and commits don't wait for the
+        # disk, which is safe in WAL mode
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        # Databases from before the stats were stored
+        columns = [row[1] for row in
+                   self.conn.execute("PRAGMA table_info(runs)").fetchall()]
+        if "stats" not in columns:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN stats TEXT")
+
         self.conn.commit()
 
     def _get_identifying_id(self, table: str, col: str, value: str) -> id:
-        self.lock.acquire()
         computer = self.conn.execute(f"SELECT id FROM {table} WHERE {col}=?",
                                      (value,)).fetchone()
         if computer is not None:
-            self.lock.release()
             return computer[0]
 
         cur = self.conn.cursor()
@@ -31,8 +41,6 @@ class Database:
         cur.close()
         self.conn.commit()
 
-        self.lock.release()
-
         return computer_id
 
     def get_computer_id(self, name: str) -> int:
@@ -41,29 +49,18 @@ class Database:
     def get_version_id(self, hex: str) -> int:
         return self._get_identifying_id("versions", "hex", hex)
 
-    def _create_run(self, data):
-        cur = self.conn.cursor()
-        cur.execute("INSERT INTO runs "
-                    "(version_id, grid_id, computer_id, thread, time_limit) "
-                    "VALUES (?,?,?,?,?)", data)
-        run_id = cur.lastrowid
-        cur.close()
-        self.conn.commit()
-
-        return run_id
-
-    def get_grid(self, version_id, computer_id, thread, time_limit, agents,
-                 waypoints, size, infill):
+    def get_grid(self, version_id, computer_id, agents, waypoints, size,
+                 infill, exclude: Collection[int] = ()) \
+            -> Tuple[int, Dict]:
         """
         Tries to find an existing grid to test on with the given parameters,
-        that this version has not yet ran on. If such version does not exist,
-        a new grid will be created.
+        that this version has not yet ran on, and is not excluded. If there
+        is none, a new grid will be created.
 
-        Creates a new run entry, of which the ID will be returned.
+        :return: the ID of the grid, and its data
         """
 
-        self.lock.acquire()
-
+        exclude = list(exclude)
         grid_row = self.conn.execute("SELECT g.id, data FROM grids g "
                                      "LEFT OUTER JOIN runs r "
                                      "ON r.grid_id = g.id AND version_id = ? "
@@ -73,29 +70,20 @@ class Database:
                                      "AND g.width=? AND g.height = ? "
                                      "AND g.infill = ? AND g.agents = ? "
                                      "AND g.waypoints = ? "
+                                     "AND g.id NOT IN "
+                                     f"({','.join('?' * len(exclude))}) "
                                      "ORDER BY r.finished DESC "
                                      "LIMIT 1",
                                      (version_id, computer_id, size, size,
-                                      infill, agents, waypoints)).fetchone()
+                                      infill, agents, waypoints,
+                                      *exclude)).fetchone()
 
         if grid_row is not None:
-            # Generate grid instance...
-            grid = Grid(size, size)
-            grid_data = json.loads(grid_row[1])
-            self.lock.release()
-            return self._create_run((version_id, grid_row[0], computer_id,
-                                     thread, time_limit)), grid_data
+            return grid_row[0], json.loads(grid_row[1])
 
         # Create brand new instance
-        grid = save_generate_grid(agents, waypoints, size)
-        grid_data = {
-            "width": grid.w,
-            "height": grid.h,
-            "starts": grid.starts,
-            "goals": grid.goals,
-            "waypoints": [list(map.waypoints) for map in grid.waypoints],
-            "walls": [[int(t) for t in row] for row in grid.walls],
-        }
+        grid = save_generate_grid(agents, waypoints, size, infill)
+        grid_data = grid.data()
 
         cur = self.conn.cursor()
         cur.execute("INSERT INTO grids "
@@ -104,28 +92,25 @@ class Database:
                                               infill, json.dumps(grid_data)))
         grid_id = cur.lastrowid
         cur.close()
-        self.conn.commit()
-        self.lock.release()
-
-        return self._create_run((version_id, grid_id, computer_id,
-                                 thread, time_limit)), grid_data
 
-    def complete_run(self, run_id, time):
-        self.lock.acquire()
-        self.conn.execute("UPDATE runs SET runtime = ?, finished = 1 "
-                          "WHERE id = ?",
-                          (time, run_id))
-        self.conn.commit()
-        self.lock.release()
+        return grid_id, grid_data
 
-    def grid_info(self, run_id):
-        self.lock.acquire()
-        row = self.conn.execute("SELECT width, height, agents, waypoints, "
-                                "infill FROM grids g "
-                                "JOIN runs r ON r.grid_id = g.id "
-                                "WHERE r.id = ?", (run_id,)).fetchone()
-        self.lock.release()
+    def add_run(self, version_id, grid_id, computer_id, thread, time_limit,
+                runtime, stats=None):
+        """
+        Add a finished run, committed with the next commit.
+        :param runtime: None for a timeout
+        :param stats: SolveStats.to_dict of the run, stored as JSON
+        """
 
-        width, height, agents, waypoints, infill = row
+        self.conn.execute("INSERT INTO runs "
+                          "(version_id, grid_id, computer_id, thread, "
+                          "time_limit, runtime, finished, stats) "
+                          "VALUES (?,?,?,?,?,?,1,?)",
+                          (version_id, grid_id, computer_id, thread,
+                           time_limit, runtime,
+                           json.dumps(stats) if stats is not None
+                           else None))
 
-        return f"Grid({width}x{height} {infill}% {agents}A {waypoints}W)"
+    def commit(self):
+        self.conn.commit()
@@ -31,5 +31,6 @@ CREATE TABLE IF NOT EXISTS runs
     time_limit  DECIMAL  NOT NULL,
     runtime     DECIMAL,
     finished    INTEGER  NOT NULL DEFAULT 0,
+    stats       TEXT,
     timestamp   DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Cache of the distance fields of the grids, shared by all grids with the same
+wall layout. Fields are kept in memory up to a limit, and optionally stored
+on disk so later runs on the same maps skip the breadth first searches.
+"""
+import os
+import sys
+from typing import List, Optional
+
+from lru import LRUCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bytes of an int object, distances above 256 are not shared
+INT_BYTES = sys.getsizeof(1 << 16)
+
+
+def field_bytes(field: List) -> int:
+    """
+    Upper bound of the memory of a field: the list and an int per cell.
+
+    >>> field_bytes([0] * 100) > 100 * INT_BYTES
+    True
+    """
+
+    return sys.getsizeof(field) + len(field) * INT_BYTES
+
+
+class DistanceCache:
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES,
+                 directory: Optional[str] = None):
+        """
+        :param max_bytes: approximate memory limit of the fields in memory
+        :param directory: where to store the fields as .npy files, or None
+                          to keep them in memory only
+        """
+
+        if directory is not None and np is None:
+            raise ImportError("NumPy is required to store distance fields")
+
+        self.fields = LRUCache(max_bytes, field_bytes)
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _file(self, layout: str, source: int) -> str:
+        return os.path.join(self.directory, f"{layout}_{source}.npy")
+
+    def get(self, layout: str, source: int) -> Optional[List]:
+        field = self.fields.get((layout, source))
+        if field is not None or self.directory is None:
+            return field
+
+        file = self._file(layout, source)
+        if not os.path.exists(file):
+            return None
+
+        # Read whole, as the fields are used as lists. Unreachable cells are
+        # stored as -1
+        field = [d if d >= 0 else None for d in np.load(file).tolist()]
+        self.fields.put((layout, source), field)
+
+        return field
+
+    def put(self, layout: str, source: int, field: List):
+        self.fields.put((layout, source), field)
+
+        if self.directory is None:
+            return
+
+        # Written under a temporary name first, as other processes may read
+        temporary_file = self._file(layout, source) + f".{os.getpid()}"
+        with open(temporary_file, "wb") as file:
+            np.save(file, np.array([d if d is not None else -1
+                                    for d in field], dtype=np.int32))
+        os.replace(temporary_file, self._file(layout, source))
+
+
+cache = DistanceCache()
+
+
+def configure(max_bytes: int = DEFAULT_MAX_BYTES,
+              directory: Optional[str] = None):
+    """
+    Replace the shared cache, e.g. to store the fields on disk.
+    """
+
+    global cache
+    cache = DistanceCache(max_bytes, directory)
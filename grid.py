@@ -1,22 +1,56 @@
-from queue import Queue
-from typing import List, Optional
+from collections import deque
+from hashlib import sha1
+from typing import List, Optional, Tuple
 
+import distance_cache
+import wavefront
 from cat import CAT
 from group import Group
-from node import Node
+from lru import LRUCache
+from node import Node, no_moves
 from pathset import PathSet
+from stats import SolveStats
 from waypoint_map import WaypointMap
 
 
 class Grid:
 
-    def __init__(self, width, height, illegal_moves=None):
+    def __init__(self, width, height, illegal_moves=None, layout=None):
+        """
+        :param layout: Optional[Grid] of the same size to share the walls
+        and neighbours of, instead of starting with an empty grid.
+        """
+
         self.w = width
         self.h = height
-        self.walls = [[False for _ in range(width)] for _ in range(height)]
+        self.cells = width * height
+
+        # Hash of the walls, to share distance fields between grids
+        self.layout: Optional[str] = None
+
+        # Neighbours as a NumPy array for the wavefront, built on first use
+        self.neighbour_table = None
+
+        if layout is not None:
+            self.walls = layout.walls
+            self.neighbours = layout.neighbours
+            self.layout = layout.layout
+        else:
+            self.walls = [False] * self.cells
+
+            # Non-wall neighbours of every cell, kept up to date by add_wall
+            self.neighbours: List[Tuple[int, ...]] = [
+                self._open_neighbours(cell) for cell in range(self.cells)]
 
         self.options = {
-            "tsp": "opt"
+            "tsp": "opt",
+            "pc": False,
+            "ord": False,
+            "queue": "heap",
+            "workers": 1,
+            "heuristic_cache": 100000,
+            "conflict": "first",
+            "search": "od",
         }
 
         self.agents = 0
@@ -27,28 +61,77 @@ class Grid:
         self.cat: Optional[CAT] = None
         self.group: Optional[Group] = None
 
+        # Collected while solving when set, see SolveStats
+        self.stats: Optional[SolveStats] = None
+
+    def cell(self, x, y) -> int:
+        """
+        Index of the cell at a coordinate. All positions within the solver
+        are cell indices.
+        """
+
+        return x + y * self.w
+
+    def coordinates(self, cell) -> Tuple[int, int]:
+        return cell % self.w, cell // self.w
+
+    def _open_neighbours(self, cell) -> Tuple[int, ...]:
+        """
+        Neighbouring cells of a cell, ignoring walls, in the order of
+        valid_neighbours.
+        """
+
+        x, y = self.coordinates(cell)
+        neighbours = []
+
+        if x > 0:
+            neighbours.append(cell - 1)
+        if y > 0:
+            neighbours.append(cell - self.w)
+        neighbours.append(cell)
+        if y < self.h - 1:
+            neighbours.append(cell + self.w)
+        if x < self.w - 1:
+            neighbours.append(cell + 1)
+
+        return tuple(neighbours)
+
     def add_wall(self, x, y):
         assert self.agents == 0, "Add agents after all walls are added"
-        self.walls[y][x] = True
+        wall = self.cell(x, y)
+        if self.walls[wall]:
+            return
+        self.walls[wall] = True
+        self.layout = None
+        self.neighbour_table = None
+
+        for neighbour in self._open_neighbours(wall):
+            self.neighbours[neighbour] = tuple(
+                n for n in self.neighbours[neighbour] if n != wall)
 
     def add_agent(self, start, goal):
         """
         Also calculates the heuristics for this agent.
+        :param start: Tuple[int, int] coordinate of the start
+        :param goal: Tuple[int, int] coordinate of the goal
         """
         self.agents += 1
-        self.starts.append(start)
-        self.goals.append(goal)
-        self.waypoints.append(WaypointMap(self, goal))
+        self.starts.append(self.cell(*start))
+        self.goals.append(self.cell(*goal))
+        self.waypoints.append(WaypointMap(self, self.goals[-1]))
 
     def add_waypoint(self, agent, x, y):
+        waypoint = self.cell(x, y)
+
         # Ignore if on start/goal
-        if (x, y) in [self.starts[agent], self.goals[agent]]:
+        if waypoint in [self.starts[agent], self.goals[agent]]:
             return
 
-        self.waypoints[agent].add_waypoint(x, y)
+        self.waypoints[agent].add_waypoint(waypoint)
 
     def root_node(self):
-        return Node(self, self.starts[:], [None] * self.agents, 0, None, 0, [])
+        return Node(self, tuple(self.starts), no_moves(self.agents), 0, None,
+                    0, ())
 
     def is_move_illegal(self, from_time, move_from, move_to):
         if self.illegal_moves is None:
@@ -65,69 +148,137 @@ class Grid:
 
     def valid_neighbours(self, position):
         """
-        Neighbours of a cell that are non walls.
+        Neighbours of a cell that are non walls, including the cell itself.
 
         >>> grid = Grid(5, 2)
         >>> grid.add_wall(1, 0)
         >>> grid.add_wall(2, 0)
-        >>> grid.valid_neighbours((0,0))
+        >>> [grid.coordinates(c) for c in grid.valid_neighbours(grid.cell(0, 0))]
         [(0, 0), (0, 1)]
 
         >>> grid = Grid(5, 2)
         >>> grid.add_wall(1, 0)
         >>> grid.add_wall(2, 0)
-        >>> grid.valid_neighbours((3,1))
+        >>> [grid.coordinates(c) for c in grid.valid_neighbours(grid.cell(3, 1))]
         [(2, 1), (3, 0), (3, 1), (4, 1)]
         """
 
-        neighbours = []
+        return self.neighbours[position]
+
+    def layout_hash(self) -> str:
+        """
+        Hash identifying the size and walls of this grid.
+        """
+
+        if self.layout is None:
+            walls = bytes(self.walls)
+            self.layout = sha1(f"{self.w}x{self.h}".encode() + walls) \
+                .hexdigest()
+
+        return self.layout
+
+    def backtrack_heuristics(self, from_pos):
+        """
+        Calculate the heuristics for each cell for a goal. Fields are shared
+        with all grids with the same walls through the distance cache, so
+        they must not be modified.
+        """
 
-        for x_offs in [-1, 0, 1]:
-            for y_offs in [-1, 0, 1]:
-                # Only non-diagonal
-                if x_offs != 0 and y_offs != 0:
-                    continue
+        layout = self.layout_hash()
+        heuristics = distance_cache.cache.get(layout, from_pos)
+        if heuristics is None:
+            if wavefront.np is not None and \
+                    self.cells >= wavefront.MIN_CELLS:
+                heuristics = [d if d >= 0 else None for d in
+                              self.wavefront_distances(from_pos).ravel()
+                              .tolist()]
+            else:
+                heuristics = self.breadth_first_distances(from_pos)
+            distance_cache.cache.put(layout, from_pos, heuristics)
+
+        return heuristics
 
-                x = position[0] + x_offs
-                y = position[1] + y_offs
+    def prepare(self):
+        """
+        Setup stage before solving: compute the distance fields of all goals
+        and waypoints in one batch, computing cells that are the source for
+        several agents once, and tabulate the waypoint distances.
+        """
 
-                if x < 0 or x >= self.w:
-                    continue
-                if y < 0 or y >= self.h:
-                    continue
+        sources = set(self.goals)
+        for waypoint_map in self.waypoints:
+            sources |= waypoint_map.waypoints
+        self.compute_distance_fields(sorted(sources))
 
-                assert 0 <= x < self.w, "Valid X neighbour"
-                assert 0 <= y < self.h, "Valid Y neighbour"
+        for waypoint_map in self.waypoints:
+            if waypoint_map.cell_distances is None:
+                waypoint_map.prepare()
 
-                if not self.walls[y][x]:
-                    neighbours.append((x, y))
+    def compute_distance_fields(self, sources: List[int]):
+        """
+        Put the distance fields of the cells that are not cached yet into the
+        distance cache, side by side in the wavefront when NumPy is available
+        and there is enough work.
+        """
 
-        return neighbours
+        layout = self.layout_hash()
+        missing = [source for source in sources
+                   if distance_cache.cache.get(layout, source) is None]
 
-    def backtrack_heuristics(self, from_pos):
+        if wavefront.np is None or \
+                len(missing) * self.cells < wavefront.MIN_CELLS:
+            for source in missing:
+                distance_cache.cache.put(
+                    layout, source, self.breadth_first_distances(source))
+            return
+
+        if self.neighbour_table is None:
+            self.neighbour_table = wavefront.neighbour_table(
+                self.walls, self.w, self.h)
+
+        batch_size = max(1, wavefront.BATCH_CELLS // self.cells)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            fields = wavefront.distance_fields(self.neighbour_table, batch)
+            for source, field in zip(batch, fields.tolist()):
+                distance_cache.cache.put(
+                    layout, source, [d if d >= 0 else None for d in field])
+
+    def wavefront_distances(self, from_pos):
         """
-        Calculate the heuristics for each cell for a goal.
+        Distance from a cell to each cell as a height x width NumPy array,
+        with -1 for unreachable cells.
+
+        >>> grid = Grid(3, 2)
+        >>> grid.add_wall(1, 0)
+        >>> grid.wavefront_distances(grid.cell(0, 0)).tolist()
+        [[0, -1, 4], [1, 2, 3]]
         """
 
-        queue = Queue()
-        visited = set()
-        heuristics = [[None for _ in range(self.w)] for _ in range(self.h)]
+        if self.neighbour_table is None:
+            self.neighbour_table = wavefront.neighbour_table(
+                self.walls, self.w, self.h)
 
-        queue.put((from_pos, 0))
+        return wavefront.distance_fields(self.neighbour_table, [from_pos]) \
+            .reshape(self.h, self.w)
 
-        while not queue.empty():
-            position, heuristic = queue.get()
-            x, y = position
-            visited.add(position)
+    def breadth_first_distances(self, from_pos):
+        """
+        Distance from a cell to each cell, or None for unreachable cells.
+        """
 
-            # Is this the most efficient path?
-            if heuristics[y][x] is not None and heuristic >= heuristics[y][x]:
-                continue
-            heuristics[y][x] = heuristic
+        heuristics = [None] * self.cells
+        heuristics[from_pos] = 0
+        queue = deque([from_pos])
+
+        while queue:
+            position = queue.popleft()
+            heuristic = heuristics[position] + 1
 
             for neighbour in self.valid_neighbours(position):
-                if neighbour not in visited:
-                    queue.put((neighbour, heuristic + 1))
+                if heuristics[neighbour] is None:
+                    heuristics[neighbour] = heuristic
+                    queue.append(neighbour)
 
         return heuristics
 
@@ -135,12 +286,68 @@ class Grid:
         return self.waypoints[agent].heuristic(position, visited_waypoints,
                                                self.options)
 
-    def on_visitable_waypoint(self, agent, position, visited):
-        if position in visited:
-            return False
+    def operators(self, agent, position, visited: int) \
+            -> Tuple[Tuple[int, int], ...]:
+        """
+        Moves of an agent as (f difference, neighbour), by increasing
+        difference when the move costs one. Kept per cell and visited
+        waypoints for the partial expansion search, in a cache bounded by
+        the heuristic_cache option, where 0 disables it.
+        """
+
+        capacity = self.options["heuristic_cache"]
+        if capacity == 0:
+            return self.uncached_operators(agent, position, visited)
+
+        waypoint_map = self.waypoints[agent]
+        if waypoint_map.operators is None:
+            waypoint_map.operators = LRUCache(capacity)
+
+        key = visited * self.cells + position
+        operators = waypoint_map.operators.get(key)
+        if operators is None:
+            operators = self.uncached_operators(agent, position, visited)
+            waypoint_map.operators.put(key, operators)
+
+        return operators
+
+    def uncached_operators(self, agent, position, visited: int) \
+            -> Tuple[Tuple[int, int], ...]:
+        h_before = self.heuristic(agent, position, visited)
+        operators = []
+        for neighbour in self.valid_neighbours(position):
+            new_visited = visited | self.visitable_waypoint_bit(
+                agent, neighbour, visited)
+            h_after = self.heuristic(agent, neighbour, new_visited)
+            operators.append((1 + h_after - h_before, neighbour))
+
+        return tuple(sorted(operators))
+
+    def heuristic_cache_counts(self) -> Tuple[int, int]:
+        """
+        Hits and misses of the heuristic caches of all agents, in this
+        process only.
+        """
+
+        caches = [waypoint_map.cache for waypoint_map in self.waypoints
+                  if waypoint_map.cache is not None]
+        return sum(cache.hits for cache in caches), \
+            sum(cache.misses for cache in caches)
+
+    def visitable_waypoint_bit(self, agent, position, visited: int) -> int:
+        """
+        The bit of the waypoint at a position if the agent can visit it now,
+        given the mask of waypoints it visited. Otherwise zero.
+        """
 
-        return self.waypoints[agent].is_waypoint(position) and \
-               self.can_visit_waypoint(agent, position, visited)
+        bit = self.waypoints[agent].bits.get(position, 0)
+        if not bit or visited & bit:
+            return 0
+
+        if not self.can_visit_waypoint(agent, position, visited):
+            return 0
+
+        return bit
 
     def can_visit_waypoint(self, agent, position, visited):
         if not self.options["ord"]:
@@ -156,9 +363,9 @@ class Grid:
         :param illegal_moves: Optional[PathSet]
         """
 
-        new_grid = Grid(self.w, self.h, illegal_moves)
-        new_grid.walls = self.walls
+        new_grid = Grid(self.w, self.h, illegal_moves, layout=self)
         new_grid.options = self.options
+        new_grid.stats = self.stats
 
         for agent_index in agents:
             new_grid.starts.append(self.starts[agent_index])
@@ -170,18 +377,58 @@ class Grid:
 
         return new_grid
 
+    def data(self):
+        """
+        The problem as JSON compatible data with coordinates, as stored in
+        the runs database and the benchmark suites.
+        """
+
+        return {
+            "width": self.w,
+            "height": self.h,
+            "starts": [self.coordinates(s) for s in self.starts],
+            "goals": [self.coordinates(g) for g in self.goals],
+            "waypoints": [[self.coordinates(w)
+                           for w in waypoint_map.ordered_waypoints]
+                          for waypoint_map in self.waypoints],
+            "walls": [[int(self.walls[self.cell(x, y)])
+                       for x in range(self.w)] for y in range(self.h)],
+        }
+
+    @staticmethod
+    def from_data(data) -> "Grid":
+        """
+        Create a grid from the data of Grid.data.
+        """
+
+        grid = Grid(data["width"], data["height"])
+
+        for y in range(grid.h):
+            for x in range(grid.w):
+                if data["walls"][y][x]:
+                    grid.add_wall(x, y)
+
+        for start, goal in zip(data["starts"], data["goals"]):
+            grid.add_agent(tuple(start), tuple(goal))
+
+        for agent, waypoints in enumerate(data["waypoints"]):
+            for x, y in waypoints:
+                grid.add_waypoint(agent, x, y)
+
+        return grid
+
     def pretty_print(self):
-        for y, row in enumerate(self.walls):
-            for x, tile in enumerate(row):
+        for y in range(self.h):
+            for x in range(self.w):
+                cell = self.cell(x, y)
                 char = "."
-                if tile:
+                if self.walls[cell]:
                     char = "#"
-                if (x, y) in self.goals:
+                if cell in self.goals:
                     char = "X"
-                if (x, y) in self.starts:
+                if cell in self.starts:
                     char = "O"
-                if any((x, y) in [tuple(w) for w in
-                                  self.waypoints[agent].waypoints]
+                if any(cell in self.waypoints[agent].waypoints
                        for agent in range(self.agents)):
                     char = "@"
                 print(char, end="")
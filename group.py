@@ -1,9 +1,15 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import logger
+from conflict_index import Conflict, ConflictIndex
 from pathset import PathSet
 
+# Which conflicting groups independence detection handles first: those of
+# the first conflict, the pair with the most conflicts, or the pair with the
+# fewest agents, which is the cheapest to replan or merge
+CONFLICT_POLICIES = ["first", "most", "cheapest"]
+
 
 class Group:
 
@@ -58,6 +64,12 @@ class Group:
 
         return Group(sorted(self.agents + other.agents), self.base_grid)
 
+    def __getstate__(self):
+        # Worker processes already have the base grid, see solver.start_worker
+        state = self.__dict__.copy()
+        state["base_grid"] = None
+        return state
+
     def __contains__(self, item: int):
         return item in self.agents
 
@@ -65,30 +77,73 @@ class Group:
         return tuple(sorted(self.agents))
 
     @staticmethod
-    def conflicting(groups: List[Group]) -> Optional[Tuple[Group, Group]]:
+    def conflicting(groups: List[Group],
+                    conflict_index: Optional[ConflictIndex] = None,
+                    policy: str = "first") -> \
+            Optional[Tuple[Group, Group]]:
         """
         Finds the conflicting groups in a set of groups. All the groups need
         to be solved already.
-        :return: First two groups to conflict, or None if there were no
-                 conflicts.
+        :param conflict_index: index of the paths from previous calls, so only
+                               the groups that changed since are re-checked
+        :param policy: which pair of groups to return, see CONFLICT_POLICIES
+        :return: Two conflicting groups, in the order of the list, or None if
+                 there were no conflicts.
         """
 
         assert all(g.solution is not None for g in groups), "Groups are solved"
 
+        if conflict_index is None:
+            conflict_index = ConflictIndex()
+        conflict_index.update(groups)
+
         # See if there are conflicts
-        conflicts = Group.combined_solution(groups).conflicts()
-        if conflicts is None:
+        if not conflict_index.conflicts:
             return None
 
-        # Find appropriate groups
-        conflicting_a, conflicting_b = conflicts
-        conflicting_groups = tuple(g for g in groups if
-                                   conflicting_a in g.agents or
-                                   conflicting_b in g.agents)
+        if policy == "first":
+            conflict = conflict_index.first_conflict()
+            _, _, conflicting_a, conflicting_b = conflict
+            conflicting_groups = tuple(g for g in groups if
+                                       conflicting_a in g.agents or
+                                       conflicting_b in g.agents)
+
+            assert len(conflicting_groups), "No duplicate agents in groups"
+
+            return conflicting_groups[0:2]
+
+        pairs = Group.conflict_counts(groups, conflict_index)
+        if policy == "most":
+            first, second = min(pairs, key=lambda pair: (-pairs[pair][0],
+                                                         pairs[pair][1]))
+        else:
+            first, second = min(pairs, key=lambda pair: (
+                len(groups[pair[0]].agents) + len(groups[pair[1]].agents),
+                pairs[pair][1]))
+
+        return groups[first], groups[second]
+
+    @staticmethod
+    def conflict_counts(groups: List[Group], conflict_index: ConflictIndex) \
+            -> Dict[Tuple[int, int], Tuple[int, Conflict]]:
+        """
+        Count the conflicts between every pair of groups in one sweep.
+        :return: the number of conflicts and the first conflict, by the
+                 indices of the groups in the list
+        """
+
+        group_indices = {agent: index for index, group in enumerate(groups)
+                         for agent in group.agents}
 
-        assert len(conflicting_groups), "No duplicate agents in groups"
+        pairs = dict()
+        for conflict in conflict_index.conflicts:
+            _, _, agent_a, agent_b = conflict
+            pair = tuple(sorted((group_indices[agent_a],
+                                 group_indices[agent_b])))
+            count, first = pairs.get(pair, (0, conflict))
+            pairs[pair] = count + 1, min(first, conflict)
 
-        return conflicting_groups[0:2]
+        return pairs
 
     @staticmethod
     def combined_solution(groups: List[Group]) -> PathSet:
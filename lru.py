@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """
+    Dictionary that evicts the least recently used entries once the total
+    weight of its values exceeds the capacity. By default every value weighs
+    one, so the capacity is the number of entries. Misses return None.
+
+    >>> cache = LRUCache(2)
+    >>> cache.put("a", 1)
+    >>> cache.put("b", 2)
+    >>> cache.get("a")
+    1
+    >>> cache.put("c", 3)
+    >>> cache.get("b") is None
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, capacity: int,
+                 weigh: Optional[Callable[[object], int]] = None):
+        self.capacity = capacity
+        self.weigh = weigh
+        self.entries = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.weight -= self._weight_of(self.entries.pop(key))
+
+        self.entries[key] = value
+        self.weight += self._weight_of(value)
+
+        while self.weight > self.capacity and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.weight -= self._weight_of(evicted)
+
+    def _weight_of(self, value) -> int:
+        if self.weigh is None:
+            return 1
+        return self.weigh(value)
+
+    def __len__(self):
+        return len(self.entries)
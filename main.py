@@ -7,12 +7,15 @@ import click
 from mapfw import MapfwBenchmarker
 from mapfw.problem import Problem
 
+import distance_cache
 import logger
+import search_trace
 from grid import Grid
-from solver import solve_od_id
+from group import CONFLICT_POLICIES
+from solver import SOLVERS
 
 
-def solver(problem: Problem, options) -> List:
+def solver(problem: Problem, options, solver_name="id") -> List:
     grid = Grid(problem.width, problem.height)
     grid.options = options
 
@@ -28,9 +31,9 @@ def solver(problem: Problem, options) -> List:
         for waypoint in waypoints:
             grid.add_waypoint(agent, waypoint[0], waypoint[1])
 
-    solution = solve_od_id(grid)
+    solution = SOLVERS[solver_name](grid)
 
-    return solution.to_json()
+    return solution.to_json(grid)
 
 
 @click.command()
@@ -39,6 +42,10 @@ def solver(problem: Problem, options) -> List:
               type=str,
               help="Name of the algorithm version, can be left empty to "
                    "generate based on options.")
+@click.option('--solver', 'solver_name', default="id",
+              type=click.Choice(list(SOLVERS), case_sensitive=False),
+              help="Solver for the whole problem: A*+OD with independence "
+                   "detection, or Conflict-Based Search. (Default: id)")
 @click.option('--tsp', '-t', default="Dyn",
               type=click.Choice(["Dyn", "MST"], case_sensitive=False),
               help="Algorithm for calculating the TSP heuristic: "
@@ -61,20 +68,65 @@ def solver(problem: Problem, options) -> List:
               help="Prioritize lower conflicts before a lower heuristic when "
                    "expanding nodes. With this option, the TSP method is "
                    "irrelevant.")
+@click.option('--queue', '-q', default="heap",
+              type=click.Choice(["heap", "bucket"], case_sensitive=False),
+              help="Open list of the A* search: a binary heap, or a bucket "
+                   "queue on the f-value and first tie breaker. "
+                   "(Default: heap)")
+@click.option('--workers', '-w',
+              type=click.IntRange(1, multiprocessing.cpu_count()),
+              default=1,
+              help="Number of processes to plan independent groups of a "
+                   "single benchmark with. Use with --cores 1.")
+@click.option('--search', default="od",
+              type=click.Choice(["od", "pea"], case_sensitive=False),
+              help="Search for the paths of a group: A* with operator "
+                   "decomposition, or with enhanced partial expansion on top, "
+                   "which creates fewer nodes. (Default: od)")
+@click.option('--conflicts', default="first",
+              type=click.Choice(CONFLICT_POLICIES, case_sensitive=False),
+              help="Which conflicting groups to resolve first: those of the "
+                   "first conflict, the pair with the most conflicts, or the "
+                   "pair with the fewest agents. (Default: first)")
+@click.option('--heuristic-cache',
+              type=click.IntRange(0, None),
+              default=100000,
+              help="Number of heuristic values, and of move orders of the "
+                   "pea search, to remember per agent, by position and "
+                   "visited waypoints. 0 disables the caches. "
+                   "(Default: 100000)")
+@click.option('--distance-cache', 'cache_directory',
+              type=click.Path(file_okay=False),
+              help="Directory to store the distance fields of the maps in, "
+                   "so runs on the same maps skip computing them. "
+                   "Requires NumPy.")
 @click.option('--debug', '-d', is_flag=True,
               help="Run benchmark(s) as debug attempt.")
 @click.option('--verbose', '-v', is_flag=True,
               help="Print and log extra information during solving.")
+@click.option('--trace', 'trace_file', type=click.Path(dir_okay=False),
+              help="Write every expanded and generated node of the A*+OD "
+                   "searches to a binary trace file, for replaying them. "
+                   "Use with --cores 1 and --workers 1.")
 @click.option('--official', '-o', is_flag=True,
               help="Indicate this is an officially timed run on the "
                    "TU Delft server. Will append '(TU)' to the version.")
-def main(benchmarks, name, tsp, cores, timeout, sequential, prio_conflicts, debug,
-         verbose, official):
+def main(benchmarks, name, solver_name, tsp, cores, timeout, sequential,
+         prio_conflicts, queue, workers, search, conflicts, heuristic_cache,
+         cache_directory, debug, verbose, trace_file, official):
     if not name:
         name = f"pc={'T' if prio_conflicts else 'F'}," \
                f"ord={'T' if sequential else 'F'}"
         if not sequential:
             name = f"tsp={tsp}," + name
+        if queue.lower() != "heap":
+            name += f",queue={queue.lower()}"
+        if solver_name.lower() != "id":
+            name += f",solver={solver_name.lower()}"
+        if search.lower() != "od":
+            name += f",search={search.lower()}"
+        if conflicts.lower() != "first":
+            name += f",conflicts={conflicts.lower()}"
     if official:
         name += ' (TU)'
 
@@ -82,14 +134,26 @@ def main(benchmarks, name, tsp, cores, timeout, sequential, prio_conflicts, debu
         return solver(problem, {
             "tsp": tsp.lower(),
             "pc": prio_conflicts,
-            "ord": sequential
-        })
+            "ord": sequential,
+            "queue": queue.lower(),
+            "workers": workers,
+            "heuristic_cache": heuristic_cache,
+            "conflict": conflicts.lower(),
+            "search": search.lower(),
+        }, solver_name.lower())
+
+    if cache_directory:
+        distance_cache.configure(directory=cache_directory)
 
     api_key = open("api_key.txt", "r").read().strip()
-    benchmark = MapfwBenchmarker(api_key, benchmarks, "A*+OD+ID", name,
+    algorithm = "CBS" if solver_name.lower() == "cbs" else "A*+OD+ID"
+    benchmark = MapfwBenchmarker(api_key, benchmarks, algorithm, name,
                                  debug, prepped_solver, cores=cores, timeout=timeout)
     logger.start(info=debug, debug=verbose)
+    if trace_file:
+        search_trace.start(trace_file)
     benchmark.run()
+    search_trace.stop()
     logger.stop()
 
 
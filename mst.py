@@ -1,11 +1,26 @@
-from typing import Dict, Tuple
+from array import array
+from typing import Dict, Hashable, List, Sequence
 
 
 class MST:
+    """
+    Cost of the minimum spanning tree of a graph, with Kruskal's algorithm on
+    a union-find of the vertices.
+
+    >>> mst = MST()
+    >>> mst.add_vertices("abc")
+    >>> mst.add_edge("a", "b", 3)
+    >>> mst.add_edge("b", "c", 1)
+    >>> mst.add_edge("a", "c", 2)
+    >>> mst.cost()
+    3
+    """
 
     def __init__(self):
-        self.vertices: Dict[Tuple[int, int], int] = dict()
-        self.edges = []
+        self.vertices: Dict[Hashable, int] = dict()
+        self.firsts = array('i')
+        self.seconds = array('i')
+        self.costs = array('i')
         self.next_vertex = 0
 
     def add_vertices(self, positions):
@@ -17,26 +32,72 @@ class MST:
         self.next_vertex += 1
 
     def add_edge(self, a, b, cost):
-        self.edges.append(((self.vertices[a], self.vertices[b]), cost))
+        self.firsts.append(self.vertices[a])
+        self.seconds.append(self.vertices[b])
+        self.costs.append(cost)
 
     def cost(self) -> int:
-        self.edges.sort(key=lambda edge: edge[1])
+        parents = list(range(self.next_vertex))
+        sizes = [1] * self.next_vertex
+        components = self.next_vertex
 
         total_cost = 0
-        groups = [[v] for v in self.vertices.values()]
+        for edge in sorted(range(len(self.costs)),
+                           key=self.costs.__getitem__):
+            if components <= 1:
+                break
 
-        for (v1, v2), cost in self.edges:
-            g1 = next(g for g in groups if v1 in g)
-            g2 = next(g for g in groups if v2 in g)
+            # Find both roots, halving the paths on the way
+            v1 = self.firsts[edge]
+            while parents[v1] != v1:
+                parents[v1] = parents[parents[v1]]
+                v1 = parents[v1]
+            v2 = self.seconds[edge]
+            while parents[v2] != v2:
+                parents[v2] = parents[parents[v2]]
+                v2 = parents[v2]
 
-            if g1 == g2:
+            if v1 == v2:
                 continue
 
-            total_cost += cost
-            g1 += g2
-            groups.remove(g2)
-
-            if len(groups) == 1:
-                break
+            # Hang the smaller tree under the larger one
+            if sizes[v1] < sizes[v2]:
+                v1, v2 = v2, v1
+            parents[v2] = v1
+            sizes[v1] += sizes[v2]
+            components -= 1
+            total_cost += self.costs[edge]
 
         return total_cost
+
+
+def dense_cost(weights: Sequence[Sequence[int]]) -> int:
+    """
+    Cost of the minimum spanning tree of a complete graph, given as a matrix
+    of edge weights, with Prim's algorithm. This takes O(V^2) without sorting
+    the edges, which suits the complete graphs between waypoints.
+
+    >>> dense_cost([[0, 3, 2], [3, 0, 1], [2, 1, 0]])
+    3
+    """
+
+    vertices = len(weights)
+    if vertices == 0:
+        return 0
+
+    # Cheapest connection of every vertex outside the tree to the tree
+    connections: List[int] = list(weights[0])
+    outside = list(range(1, vertices))
+
+    total_cost = 0
+    while outside:
+        closest = min(outside, key=connections.__getitem__)
+        outside.remove(closest)
+        total_cost += connections[closest]
+
+        closest_weights = weights[closest]
+        for vertex in outside:
+            if closest_weights[vertex] < connections[vertex]:
+                connections[vertex] = closest_weights[vertex]
+
+    return total_cost
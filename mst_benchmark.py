@@ -0,0 +1,106 @@
+"""
+Compares the minimum spanning tree algorithms on the complete graphs that the
+MST heuristic builds: the waypoints left, the position and the goal.
+"""
+import random
+import time
+from typing import Callable, List
+
+from mst import MST, dense_cost
+
+
+class ListMST:
+    """
+    The previous implementation, merging lists of vertices as components.
+    """
+
+    def __init__(self):
+        self.vertices = dict()
+        self.edges = []
+        self.next_vertex = 0
+
+    def add_vertex(self, pos):
+        self.vertices[pos] = self.next_vertex
+        self.next_vertex += 1
+
+    def add_edge(self, a, b, cost):
+        self.edges.append(((self.vertices[a], self.vertices[b]), cost))
+
+    def cost(self) -> int:
+        self.edges.sort(key=lambda edge: edge[1])
+
+        total_cost = 0
+        groups = [[v] for v in self.vertices.values()]
+
+        for (v1, v2), cost in self.edges:
+            g1 = next(g for g in groups if v1 in g)
+            g2 = next(g for g in groups if v2 in g)
+
+            if g1 == g2:
+                continue
+
+            total_cost += cost
+            g1 += g2
+            groups.remove(g2)
+
+            if len(groups) == 1:
+                break
+
+        return total_cost
+
+
+def generate_graphs(count: int, vertices: int, seed: int) \
+        -> List[List[List[int]]]:
+    """
+    Complete graphs of points on a grid, weighed by Manhattan distance.
+    """
+
+    rng = random.Random(seed)
+    graphs = []
+    for _ in range(count):
+        points = [(rng.randrange(32), rng.randrange(32))
+                  for _ in range(vertices)]
+        graphs.append([[abs(ax - bx) + abs(ay - by) for bx, by in points]
+                       for ax, ay in points])
+
+    return graphs
+
+
+def edge_list_cost(mst_class: Callable) -> Callable[[List[List[int]]], int]:
+    def cost(weights: List[List[int]]) -> int:
+        mst = mst_class()
+        for vertex in range(len(weights)):
+            mst.add_vertex(vertex)
+        for a in range(len(weights)):
+            for b in range(a):
+                mst.add_edge(a, b, weights[a][b])
+        return mst.cost()
+
+    return cost
+
+
+ALGORITHMS = {
+    "list": edge_list_cost(ListMST),
+    "kruskal": edge_list_cost(MST),
+    "prim": dense_cost,
+}
+
+
+def run(algorithm: str, graphs: List[List[List[int]]]) -> float:
+    start_time = time.time()
+    for weights in graphs:
+        ALGORITHMS[algorithm](weights)
+
+    return time.time() - start_time
+
+
+if __name__ == "__main__":
+    for vertices in [5, 10, 20, 40]:
+        graphs = generate_graphs(2000, vertices, 0)
+        expected = [ALGORITHMS["list"](weights) for weights in graphs]
+        for algorithm in ALGORITHMS:
+            costs = [ALGORITHMS[algorithm](weights) for weights in graphs]
+            assert costs == expected, f"{algorithm} disagrees"
+
+            print(f"{algorithm:>8}: {round(run(algorithm, graphs), 3)} sec "
+                  f"for 2000 graphs of {vertices} vertices")
@@ -1,38 +1,65 @@
-from typing import Set, Tuple, List, Optional
+from __future__ import annotations
+import sys
+from typing import List, Optional, Tuple
 
-from edge import Edge
+from edge import edge
+
+
+# Moves of the standard nodes, shared by all nodes with as many agents
+_no_moves = dict()
+
+
+def no_moves(agents: int) -> Tuple[None, ...]:
+    """
+    >>> no_moves(2), no_moves(2) is no_moves(2)
+    ((None, None), True)
+    """
+
+    moves = _no_moves.get(agents)
+    if moves is None:
+        moves = _no_moves[agents] = (None,) * agents
+    return moves
 
 
 class Node:
+    """
+    Search node of A* with operator decomposition. All per agent fields are
+    tuples, which children share with their parent when unchanged. Children
+    point to the last standard node before them, so intermediate nodes are
+    freed once they have been expanded.
+    """
+
+    __slots__ = ("grid", "positions", "moves", "cost", "goal_waits",
+                 "conflicts", "taken_edges", "parent", "visited_waypoints",
+                 "heuristic", "f")
 
     def __init__(self, grid, positions, moves, cost, goal_waits, conflicts,
                  taken_edges, parent=None, visited_waypoints=None,
                  new_heuristic=None):
         self.grid = grid
-        self.positions = positions
-        self.moves = moves
+        self.positions: Tuple[int, ...] = positions
+        self.moves: Tuple[Optional[int], ...] = moves
         self.cost = cost
-        self.goal_waits: List[int] = goal_waits or [0] * grid.agents
+        self.goal_waits: Tuple[int, ...] = goal_waits or (0,) * grid.agents
         self.conflicts = conflicts
-        self.taken_edges = taken_edges
+        self.taken_edges: Tuple[int, ...] = taken_edges
         self.parent = parent
 
-        # Copy or create waypoints list
-        self.visited_waypoints: List[Set[Tuple[int, int]]] = visited_waypoints
+        # Visited waypoints as a bitmask per agent, see WaypointMap.bits
+        self.visited_waypoints: Tuple[int, ...] = visited_waypoints
         if self.visited_waypoints is None:
-            self.visited_waypoints = [set() for _ in range(grid.agents)]
+            self.visited_waypoints = (0,) * grid.agents
 
         # Make node standard
         if None not in moves:
-            self.moves = [None] * len(self.positions)
+            self.moves = no_moves(len(self.positions))
             self.positions = moves
-            self.taken_edges = []
-
-        self.post_moves = [move if move is not None else pos
-                           for pos, move in zip(self.positions, self.moves)]
+            self.taken_edges = ()
 
         if new_heuristic is None:
-            self.heuristic = sum(grid.heuristic(agent, self.post_moves[agent],
+            post_moves = [move if move is not None else pos
+                          for pos, move in zip(self.positions, self.moves)]
+            self.heuristic = sum(grid.heuristic(agent, post_moves[agent],
                                                 self.visited_waypoints[agent])
                                  for agent in range(len(positions)))
         else:
@@ -40,33 +67,95 @@ class Node:
 
         self.f = self.cost + self.heuristic
 
-    def standard_hash(self):
+    def standard_hash(self) -> int:
+        """
+        Key to uniquely identify this node, given it's treated as standard.
+        So takes the positions and visited waypoints into account.
+        """
+
+        return self.packed_state(False)
+
+    def intermediate_hash(self) -> int:
+        """
+        Key to uniquely identify this intermediate node: the positions, the
+        moves assigned so far, the visited waypoints and the goal waits.
+        """
+
+        return self.packed_state(True)
+
+    def packed_state(self, with_moves: bool) -> int:
         """
-        Hash (tuple) to uniquely identify this node, given it's treated as
-        standard. So takes the positions and visited waypoints into account.
+        The state of the agents packed into a single integer, with for every
+        agent its position, its visited waypoints and optionally its move,
+        plus one, and its goal waits in 32 bits.
         """
 
-        return tuple(self.positions), tuple(
-            tuple(sorted(x + y * self.grid.w for x, y in waypoints)) for
-            waypoints in self.visited_waypoints)
+        cell_bits = self.grid.cells.bit_length()
+        waypoints = self.grid.waypoints
+        key = 0
+
+        for agent, position in enumerate(self.positions):
+            key = key << cell_bits | position
+            key = key << len(waypoints[agent].ordered_waypoints) | \
+                self.visited_waypoints[agent]
+
+            if with_moves:
+                move = self.moves[agent]
+                key = key << cell_bits | (0 if move is None else move + 1)
+                key = key << 32 | self.goal_waits[agent]
+
+        return key
+
+    def memory_size(self, source: Optional[Node] = None) -> int:
+        """
+        Approximate number of bytes taken by this node, not counting the
+        fields it shares with the node it was expanded from, or else with
+        its parent. Intermediate nodes share fields with the intermediate
+        node before them, so compared to the parent this is an upper bound.
+        """
+
+        if source is None:
+            source = self.parent
+
+        size = sys.getsizeof(self)
+        for field in ("positions", "moves", "goal_waits", "taken_edges",
+                      "visited_waypoints"):
+            value = getattr(self, field)
+            if value is no_moves(len(self.positions)):
+                continue
+            if source is None or value is not getattr(source, field):
+                size += sys.getsizeof(value)
+
+        return size
 
     def augmented(self):
         pass
 
-    def expand(self):
+    def expand(self, neighbours=None):
+        """
+        Children assigning a move to the next agent.
+        :param neighbours: cells to move to, by default all valid neighbours
+        """
+
         agent = self.moves.index(None)
         position = self.positions[agent]
+        if neighbours is None:
+            neighbours = self.grid.valid_neighbours(position)
+
+        # Moves are assigned in agent order, so only the first agent moving
+        # means this is a standard node
+        parent = self if agent == 0 else self.parent
 
         new_nodes = []
 
-        for neighbour in self.grid.valid_neighbours(position):
+        for neighbour in neighbours:
             # Check if cell is occupied by moved agent
             if neighbour in self.moves:
                 continue
 
             # Check for crossing edges
-            move_edge = Edge(position, neighbour)
-            if any(move_edge.conflicts(edge) for edge in self.taken_edges):
+            move_edge = edge(position, neighbour)
+            if move_edge in self.taken_edges:
                 continue
 
             # Check for illegal moves, if given
@@ -78,18 +167,18 @@ class Node:
             if self.grid.is_move_conflicting(self.cost, position, neighbour):
                 new_conflicts += 1
 
-            new_moves = self.moves[:]
-            new_moves[agent] = neighbour
-            new_taken_edges = self.taken_edges[:]
-            new_taken_edges.append(move_edge)
+            new_moves = self.moves[:agent] + (neighbour,) + \
+                self.moves[agent + 1:]
+            new_taken_edges = self.taken_edges + (move_edge,)
 
             # Check if this means a new waypoint is now visited for this agent
             new_visited_waypoints = self.visited_waypoints
-            if self.grid.on_visitable_waypoint(agent, neighbour,
-                                               self.visited_waypoints[agent]):
-                new_visited_waypoints = [ws.copy() for ws in
-                                         new_visited_waypoints]
-                new_visited_waypoints[agent].add(neighbour)
+            waypoint_bit = self.grid.visitable_waypoint_bit(
+                agent, neighbour, self.visited_waypoints[agent])
+            if waypoint_bit:
+                new_visited_waypoints = self.visited_waypoints[:agent] + \
+                    (self.visited_waypoints[agent] | waypoint_bit,) + \
+                    self.visited_waypoints[agent + 1:]
 
             # Agents can wait at goal for no cost, unless they will move again
             # in the future, so we need to keep track of this 'credit'
@@ -97,12 +186,12 @@ class Node:
             new_goal_waits = self.goal_waits
             if self.agent_done(agent):
                 additional_cost = 0
-                new_goal_waits = self.goal_waits[:]
-                new_goal_waits[agent] += 1
+                new_goal_waits = self.goal_waits[:agent] + \
+                    (self.goal_waits[agent] + 1,) + self.goal_waits[agent + 1:]
             elif self.goal_waits[agent]:
                 additional_cost = self.goal_waits[agent] + 1
-                new_goal_waits = self.goal_waits[:]
-                new_goal_waits[agent] = 0
+                new_goal_waits = self.goal_waits[:agent] + (0,) + \
+                    self.goal_waits[agent + 1:]
 
             # Calculate the new heuristic by looking at the difference for
             # only this agent
@@ -115,12 +204,40 @@ class Node:
 
             new_node = Node(self.grid, self.positions, new_moves,
                             self.cost + additional_cost, new_goal_waits,
-                            new_conflicts, new_taken_edges, self,
+                            new_conflicts, new_taken_edges, parent,
                             new_visited_waypoints, new_heuristic)
             new_nodes.append(new_node)
 
         return new_nodes
 
+    def expand_partial(self, delta: int) -> Tuple[List[Node], Optional[int]]:
+        """
+        Partial expansion: only the children with an f-value delta above the
+        f-value of this node, picked from the operator table of the agent.
+        :return: those children, and the next larger difference of any child
+                 or None if there is none
+        """
+
+        agent = self.moves.index(None)
+        position = self.positions[agent]
+
+        # The table is for moves costing one, see the costs in expand
+        if self.agent_done(agent):
+            shift = -1
+        else:
+            shift = self.goal_waits[agent]
+
+        neighbours = []
+        for operator_delta, neighbour in self.grid.operators(
+                agent, position, self.visited_waypoints[agent]):
+            operator_delta += shift
+            if operator_delta > delta:
+                return self.expand(neighbours), operator_delta
+            if operator_delta == delta:
+                neighbours.append(neighbour)
+
+        return self.expand(neighbours), None
+
     def is_standard(self):
         return all(move is None for move in self.moves)
 
@@ -138,10 +255,11 @@ class Node:
         for y in range(self.grid.h):
             print("|", end="")
             for x in range(self.grid.w):
-                if self.grid.walls[y][x]:
+                cell = self.grid.cell(x, y)
+                if self.grid.walls[cell]:
                     print("#", end="")
-                elif (x, y) in self.positions:
-                    print(self.positions.index((x, y)) + 1, end="")
+                elif cell in self.positions:
+                    print(self.positions.index(cell) + 1, end="")
                 else:
                     print(".", end="")
             print("|")
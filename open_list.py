@@ -0,0 +1,98 @@
+from heapq import heappush, heappop
+from typing import List, Optional
+
+
+class HeapOpenList:
+    """
+    Open list on a plain binary heap. Items are tuples that start with the
+    f-value, followed by the tie breakers, a unique node id and the node.
+    Unlike queue.PriorityQueue no locks are taken, as the search runs in a
+    single thread.
+    """
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, item):
+        heappush(self.heap, item)
+
+    def pop(self):
+        return heappop(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class BucketOpenList:
+    """
+    Two-level bucket queue on the integer f-value and the first tie breaker
+    of the items. The few items sharing a bucket are kept in a small heap on
+    the remaining tie breakers, so items are popped in the same order as from
+    the HeapOpenList.
+
+    >>> open_list = BucketOpenList()
+    >>> for item in [(3, 1, 0, 0), (2, 4, 0, 1), (2, 1, 0, 2), (2, 1, 0, 3)]:
+    ...     open_list.push(item)
+    >>> [open_list.pop() for _ in range(len(open_list))]
+    [(2, 1, 0, 2), (2, 1, 0, 3), (2, 4, 0, 1), (3, 1, 0, 0)]
+    """
+
+    def __init__(self):
+        # Buckets per f-value, each holding a queue per first tie breaker
+        self.buckets: List[Optional[List[Optional[List]]]] = []
+        self.counts: List[int] = []
+        self.lowest: List[int] = []
+        self.min_f = 0
+        self.size = 0
+
+    def push(self, item):
+        f, p1 = item[0], item[1]
+
+        if f >= len(self.buckets):
+            extra = f + 1 - len(self.buckets)
+            self.buckets.extend([None] * extra)
+            self.counts.extend([0] * extra)
+            self.lowest.extend([0] * extra)
+
+        bucket = self.buckets[f]
+        if bucket is None:
+            bucket = self.buckets[f] = []
+        if p1 >= len(bucket):
+            bucket.extend([None] * (p1 + 1 - len(bucket)))
+        if bucket[p1] is None:
+            bucket[p1] = []
+
+        heappush(bucket[p1], item)
+
+        if self.counts[f] == 0 or p1 < self.lowest[f]:
+            self.lowest[f] = p1
+        self.counts[f] += 1
+        if self.size == 0 or f < self.min_f:
+            self.min_f = f
+        self.size += 1
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError("pop from an empty open list")
+
+        while self.counts[self.min_f] == 0:
+            self.min_f += 1
+
+        f = self.min_f
+        bucket = self.buckets[f]
+        while not bucket[self.lowest[f]]:
+            self.lowest[f] += 1
+
+        self.counts[f] -= 1
+        self.size -= 1
+
+        return heappop(bucket[self.lowest[f]])
+
+    def __len__(self):
+        return self.size
+
+
+OPEN_LISTS = {
+    "heap": HeapOpenList,
+    "bucket": BucketOpenList,
+}
@@ -0,0 +1,66 @@
+"""
+Compares the open lists of the A* search, both on raw pushes and pops and on
+solving the same randomly generated grids.
+"""
+import random
+import time
+from typing import List
+
+import solver
+from grid import Grid
+from open_list import OPEN_LISTS
+from progressive import save_generate_grid
+
+
+def generate_grids(count: int, agents: int, waypoints: int, size: int,
+                   seed: int) -> List[Grid]:
+    random.seed(seed)
+    return [save_generate_grid(agents, waypoints, size) for _ in range(count)]
+
+
+def run_operations(queue: str, items: int, seed: int) -> float:
+    """
+    Push and pop items with small integer priorities, in the pattern of A*
+    where the f-values slowly rise.
+    """
+
+    rng = random.Random(seed)
+    open_list = OPEN_LISTS[queue]()
+
+    start_time = time.time()
+    f = 0
+    for node_id in range(items):
+        open_list.push((f + rng.randint(0, 2), rng.randint(0, 20), 0,
+                        node_id, None))
+        if node_id % 3 == 0:
+            f = open_list.pop()[0]
+    while open_list:
+        open_list.pop()
+
+    return time.time() - start_time
+
+
+def run_grids(queue: str, grids: List[Grid]) -> float:
+    start_time = time.time()
+    for grid in grids:
+        grid.options = {
+            "tsp": "dyn",
+            "pc": False,
+            "ord": False,
+            "queue": queue,
+            "workers": 1,
+            "heuristic_cache": 100000,
+            "conflict": "first",
+            "search": "od",
+        }
+        solver.solve_od_id(grid)
+
+    return time.time() - start_time
+
+
+if __name__ == "__main__":
+    for queue in OPEN_LISTS:
+        operations_time = run_operations(queue, 1000000, 0)
+        grids_time = run_grids(queue, generate_grids(20, 3, 3, 12, 0))
+        print(f"{queue:>8}: {round(operations_time, 2)} sec for 1M pushes, "
+              f"{round(grids_time, 2)} sec for 20 grids")
@@ -1,23 +1,21 @@
 from __future__ import annotations
 from collections import deque
 
-from typing import Tuple
-
 
 class Path:
 
     def __init__(self, positions=None):
         self.positions = positions
         if positions is None:
-            self.positions: deque[Tuple[int, int]] = deque()
+            self.positions: deque[int] = deque()
 
     def last_position(self):
         return self.positions[-1]
 
-    def add_position(self, position: Tuple[int, int]):
+    def add_position(self, position: int):
         self.positions.append(position)
 
-    def prepend_position(self, position: Tuple[int, int]):
+    def prepend_position(self, position: int):
         self.positions.appendleft(position)
 
     def __len__(self):
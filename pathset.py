@@ -1,26 +1,56 @@
 from __future__ import annotations
 from typing import List, Tuple, Set, Optional
 
-from edge import Edge
+from edge import edge
 from path import Path
 
+# Reserved (time, cell) and (time, edge) pairs
+Reservations = Tuple[Set[Tuple[int, int]], Set[Tuple[int, int]]]
+
 
 class PathSet:
 
     def __init__(self, agents: int):
         self.agents = agents
         self.paths = [Path() for _ in range(agents)]
+        self.reservations: Optional[Reservations] = None
+
+    def __getstate__(self):
+        # The reservation table is rebuilt on use instead of being sent along
+        state = self.__dict__.copy()
+        state["reservations"] = None
+        return state
 
-    def prepend_positions(self, positions: List[Tuple[int, int]]):
+    def prepend_positions(self, positions: List[int]):
         """
         Prepend a position for each agent.
         """
 
         for agent, position in enumerate(positions):
             self.paths[agent].prepend_position(position)
+        self.reservations = None
+
+    def reservation_table(self) -> Reservations:
+        """
+        The (time, cell) pairs entered and the (time, edge) pairs taken by
+        the paths, where the time of an edge is when it is started. Built on
+        first use after the paths changed.
+        """
+
+        if self.reservations is None:
+            vertices = set()
+            edges = set()
+            for path in self.paths:
+                positions = list(path)
+                for time in range(1, len(positions)):
+                    vertices.add((time, positions[time]))
+                    edges.add((time - 1, edge(positions[time - 1],
+                                              positions[time])))
+            self.reservations = vertices, edges
+
+        return self.reservations
 
-    def move_possible(self, time: int, from_pos: Tuple[int, int],
-                      to_pos: Tuple[int, int]) -> bool:
+    def move_possible(self, time: int, from_pos: int, to_pos: int) -> bool:
         """
         Check whether a movement from a position to another position is
         possible at a given time without conflicting with any of the paths in
@@ -32,14 +62,14 @@ class PathSet:
         if time + 1 >= len(self):
             return True
 
+        vertices, edges = self.reservation_table()
+
         # Move into a position already taken
-        if any(path[time + 1] == to_pos for path in self.paths):
+        if (time + 1, to_pos) in vertices:
             return False
 
         # Edge collisions
-        if any(Edge(from_pos, to_pos).conflicts(
-                Edge(path[time], path[time + 1]))
-               for path in self.paths):
+        if (time, edge(from_pos, to_pos)) in edges:
             return False
 
         return True
@@ -68,15 +98,16 @@ class PathSet:
         # Crossing edges?
         for step_before, positions in enumerate(step_positions[1:]):
             positions_before = step_positions[step_before]
-            edges = [Edge(p, p_b) for p, p_b in
-                     zip(positions, positions_before)]
+            edge_agents = dict()
+            for agent, (p, p_b) in enumerate(zip(positions, positions_before)):
+                edge_agents.setdefault(edge(p, p_b), []).append(agent)
 
-            for agent, edge in enumerate(edges):
-                for other_agent, other_edge in enumerate(edges):
-                    if other_agent == agent:
-                        continue
-                    if edge.conflicts(other_edge):
-                        return {agent, other_agent}
+            # Lowest agent sharing an edge, with the lowest other agent
+            shared = [agents for agents in edge_agents.values()
+                      if len(agents) > 1]
+            if shared:
+                agent, other_agent = min(shared)[:2]
+                return {agent, other_agent}
 
     def __len__(self):
         return max(len(path) for path in self.paths)
@@ -89,13 +120,19 @@ class PathSet:
         for t in range(len(self)):
             yield [path[t] for path in self.paths]
 
-    def to_json(self):
-        return [list(path) for path in self.paths]
+    def to_json(self, grid):
+        """
+        Paths with the cells converted back to coordinates on the grid.
+        """
+
+        return [[grid.coordinates(cell) for cell in path]
+                for path in self.paths]
 
     def pad(self):
         max_length = len(self)
         for path in self.paths:
             path.pad_to(max_length)
+        self.reservations = None
 
     @staticmethod
     def merge(solutions: List[Tuple[PathSet, List[int]]]) -> PathSet:
@@ -69,13 +69,19 @@ def find_disconnected(tiles: Set[Tuple[int, int]]) -> Set[Tuple[int, int]]:
     return disconnected
 
 
-def generate_grid(agents: int, waypoints: int, size: int) -> Grid:
+def generate_grid(agents: int, waypoints: int, size: int, infill: int = 20,
+                  rng: random.Random = random) -> Grid:
+    """
+    :param infill: percentage of the cells to make walls, before the
+                   disconnected sections are walled off
+    :param rng: source of randomness, to generate the same grid from a seed
+    """
+
     grid = Grid(size, size)
     tiles = [(x, y) for y in range(size) for x in range(size)]
 
-    # 20% walls
-    for _ in range(size * size // 5):
-        tile = random.choice(tiles)
+    for _ in range(size * size * infill // 100):
+        tile = rng.choice(tiles)
         tiles.remove(tile)
         grid.add_wall(tile[0], tile[1])
 
@@ -86,34 +92,43 @@ def generate_grid(agents: int, waypoints: int, size: int) -> Grid:
 
     # Agents
     for agent in range(agents):
-        start = random.choice(tiles)
+        start = rng.choice(tiles)
         tiles.remove(start)
-        goal = random.choice(tiles)
+        goal = rng.choice(tiles)
         tiles.remove(goal)
         grid.add_agent(start, goal)
 
         # Waypoints
         for _ in range(waypoints):
-            waypoint = random.choice(tiles)
+            waypoint = rng.choice(tiles)
             tiles.remove(waypoint)
             grid.add_waypoint(agent, waypoint[0], waypoint[1])
 
     return grid
 
 
-def save_generate_grid(agents: int, waypoints: int, size: int) -> Grid:
+def save_generate_grid(agents: int, waypoints: int, size: int,
+                       infill: int = 20,
+                       rng: random.Random = random) -> Grid:
     grid = None
     while grid is None:
         try:
-            grid = generate_grid(agents, waypoints, size)
+            grid = generate_grid(agents, waypoints, size, infill, rng)
         except IndexError:
             grid = None
     return grid
 
 
-def run_single(grid: Grid):
+def run_single(grid: Grid, solve=solver.solve_od_id):
+    # Only time the search, as without the setup stage, which the solver
+    # would find already done
+    start_time = time.time()
+    grid.prepare()
+    if grid.stats is not None:
+        grid.stats.setup_time = time.time() - start_time
+
     start_time = time.time()
-    solver.solve_od_id(grid)
+    solve(grid)
     return time.time() - start_time
 
 
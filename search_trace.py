@@ -0,0 +1,208 @@
+"""
+Binary trace of the A*+OD searches, for replaying a search offline instead
+of reading the debug log, and for scrubbing through it in the viewer in
+app/. Like the logger, the trace is global and only written while started,
+and the solver checks it once per search.
+
+The file starts with MAGIC and the version, followed by records that each
+start with their kind as a byte, all little endian:
+
+MAP       width and height as u16, the walls as a bitmap of the cells
+SEARCH    agents as u16, the bytes per cell and per visited mask as u8,
+          per agent the start and goal as u32, the number of waypoints as
+          u16 and the waypoints as u32, in the order of their visited bits
+GENERATE  node id and the id of the expanded node as u32, or ROOT_PARENT,
+          g and h as u32, per agent the position after the moves so far,
+          and per agent the visited waypoints mask
+EXPAND    node id as u32
+SKIP      node id as u32, of a node popped again
+
+Node ids start at 0 in every search. Nodes are only written when they are
+generated, so an expansion refers back to that. Masks take at most 8 bytes,
+so agents can have up to 64 waypoints in a trace, and the viewer only shows
+the visits of the first 32.
+"""
+import struct
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+MAGIC = b"MAPFWTRACE"
+VERSION = 2
+
+SEARCH = 0
+EXPAND = 1
+SKIP = 2
+GENERATE = 3
+MAP = 4
+
+ROOT_PARENT = 0xFFFFFFFF
+
+MAP_RECORD = struct.Struct("<BHH")
+SEARCH_RECORD = struct.Struct("<BHBB")
+AGENT_RECORD = struct.Struct("<IIH")
+ID_RECORD = struct.Struct("<BI")
+
+# Struct formats by number of bytes
+UNSIGNED = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+def cell_size(cells: int) -> int:
+    """
+    >>> cell_size(256 * 256), cell_size(256 * 256 + 1)
+    (2, 4)
+    """
+
+    return 2 if cells <= 1 << 16 else 4
+
+
+def visited_size(waypoints: int) -> int:
+    """
+    >>> visited_size(0), visited_size(9), visited_size(40)
+    (1, 2, 8)
+    >>> visited_size(65)
+    Traceback (most recent call last):
+    ...
+    ValueError: Traces support up to 64 waypoints per agent, not 65
+    """
+
+    for size in UNSIGNED:
+        if waypoints <= size * 8:
+            return size
+
+    raise ValueError(f"Traces support up to {max(UNSIGNED) * 8} waypoints "
+                     f"per agent, not {waypoints}")
+
+
+def generate_record(agents: int, cell_bytes: int,
+                    visited_bytes: int) -> struct.Struct:
+    return struct.Struct(f"<BIIII{agents}{UNSIGNED[cell_bytes]}"
+                         f"{agents}{UNSIGNED[visited_bytes]}")
+
+
+class Trace:
+    """
+    Writes the records of the searches to a file, as they happen.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.file.write(MAGIC + bytes([VERSION]))
+        self.walls: Optional[List[bool]] = None
+        self.node_record: Optional[struct.Struct] = None
+
+    def search(self, grid):
+        # Checked before writing anything, see visited_size
+        waypoints = [waypoint_map.ordered_waypoints
+                     for waypoint_map in grid.waypoints]
+        cell_bytes = cell_size(grid.cells)
+        visited_bytes = visited_size(max(map(len, waypoints), default=0))
+
+        # Grids of the groups share the walls of the whole problem
+        if grid.walls is not self.walls:
+            self.walls = grid.walls
+            bitmap = bytearray((grid.cells + 7) // 8)
+            for cell, wall in enumerate(grid.walls):
+                if wall:
+                    bitmap[cell // 8] |= 1 << cell % 8
+            self.file.write(MAP_RECORD.pack(MAP, grid.w, grid.h))
+            self.file.write(bitmap)
+
+        self.file.write(SEARCH_RECORD.pack(SEARCH, grid.agents, cell_bytes,
+                                           visited_bytes))
+        for agent in range(grid.agents):
+            self.file.write(AGENT_RECORD.pack(grid.starts[agent],
+                                              grid.goals[agent],
+                                              len(waypoints[agent])))
+            self.file.write(struct.pack(f"<{len(waypoints[agent])}I",
+                                        *waypoints[agent]))
+
+        self.node_record = generate_record(grid.agents, cell_bytes,
+                                           visited_bytes)
+
+    def expand(self, node_id: int):
+        self.file.write(ID_RECORD.pack(EXPAND, node_id))
+
+    def skip(self, node_id: int):
+        self.file.write(ID_RECORD.pack(SKIP, node_id))
+
+    def generate(self, node_id: int, parent_id: int, node):
+        positions = [position if move is None else move
+                     for position, move in zip(node.positions, node.moves)]
+        self.file.write(self.node_record.pack(
+            GENERATE, node_id, parent_id, node.cost, node.heuristic,
+            *positions, *node.visited_waypoints))
+
+
+tracer: Optional[Trace] = None
+
+
+def start(path: str):
+    global tracer
+    tracer = Trace(open(path, "wb"))
+
+
+def stop():
+    global tracer
+    if tracer is not None:
+        tracer.file.close()
+        tracer = None
+
+
+def disable():
+    """
+    Stop tracing without closing the file, for processes that inherited it.
+    """
+
+    global tracer
+    tracer = None
+
+
+def read(path: str) -> Iterator[Tuple]:
+    """
+    The records of a trace file as tuples of the kind and the fields, read
+    as a stream. Generated nodes are (GENERATE, id, parent id, g, h,
+    positions, visited masks).
+    """
+
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC) + 1) != MAGIC + bytes([VERSION]):
+            raise ValueError(f"Not a version {VERSION} trace file")
+
+        def unpack(record: struct.Struct):
+            return record.unpack(file.read(record.size))
+
+        node_record = None
+        agents = 0
+
+        while True:
+            kind = file.read(1)
+            if not kind:
+                return
+            kind = kind[0]
+            file.seek(-1, 1)
+
+            if kind == MAP:
+                _, width, height = unpack(MAP_RECORD)
+                bitmap = file.read((width * height + 7) // 8)
+                walls = [bool(bitmap[cell // 8] >> cell % 8 & 1)
+                         for cell in range(width * height)]
+                yield MAP, width, height, walls
+            elif kind == SEARCH:
+                _, agents, cell_bytes, visited_bytes = unpack(SEARCH_RECORD)
+                starts, goals, waypoints = [], [], []
+                for _ in range(agents):
+                    start, goal, count = unpack(AGENT_RECORD)
+                    starts.append(start)
+                    goals.append(goal)
+                    waypoints.append(list(struct.unpack(
+                        f"<{count}I", file.read(4 * count))))
+                node_record = generate_record(agents, cell_bytes,
+                                              visited_bytes)
+                yield SEARCH, starts, goals, waypoints
+            elif kind == EXPAND or kind == SKIP:
+                yield unpack(ID_RECORD)
+            elif kind == GENERATE:
+                values = unpack(node_record)
+                yield values[:5] + (values[5:5 + agents],
+                                    values[5 + agents:])
+            else:
+                raise ValueError(f"Unknown record kind {kind}")
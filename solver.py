@@ -1,13 +1,25 @@
+import functools
 import itertools
-from queue import PriorityQueue
-from typing import Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
 
 import logger
+import search_trace
 from cat import CAT
+from cbs import solve_cbs
+from conflict_index import ConflictIndex
 from grid import Grid
 from group import Group
 from node import Node
+from open_list import OPEN_LISTS
 from pathset import PathSet
+from stats import SolveStats
+
+
+# Every this many generated nodes the size of one is sampled, when logging
+# info or collecting stats
+MEMORY_SAMPLE_INTERVAL = 1000
 
 
 def create_solution(grid: Grid, node: Node) -> PathSet:
@@ -22,49 +34,116 @@ def create_solution(grid: Grid, node: Node) -> PathSet:
     return solution
 
 
+def timed_search(search):
+    """
+    Adds the time and group size of a search for a group to the stats of
+    the grid, if it has any.
+    """
+
+    @functools.wraps(search)
+    def timed(grid):
+        if grid.stats is None:
+            return search(grid)
+
+        start_time = time.perf_counter()
+        try:
+            return search(grid)
+        finally:
+            grid.stats.searches += 1
+            grid.stats.search_time += time.perf_counter() - start_time
+            grid.stats.max_group_size = max(grid.stats.max_group_size,
+                                            grid.agents)
+
+    return timed
+
+
+@timed_search
 def solve_od(grid) -> PathSet:
     """
     Solves the MAPFW problem for a given grid.
     :return: PathSet solution
     """
 
-    open_nodes = PriorityQueue()
+    solve_stats = grid.stats
+    open_nodes = OPEN_LISTS[grid.options["queue"]]()
+    if solve_stats is not None:
+        open_nodes = solve_stats.instrument(grid, open_nodes)
+
+    # Checked once, so the messages are not even formatted without them
+    info = logger.should_info
+    debug = logger.should_debug
+    tracer = search_trace.tracer
+    pc = grid.options["pc"]
+    sample_memory = info or solve_stats is not None
+
     node_id = 0
-    open_nodes.put((0, 0, 0, node_id, grid.root_node()))
+    root = grid.root_node()
+    open_nodes.push((0, 0, 0, node_id, root))
+    if tracer is not None:
+        tracer.search(grid)
+        tracer.generate(node_id, search_trace.ROOT_PARENT, root)
     node_id += 1
 
+    # Closed lists of the standard and intermediate nodes, by packed state
     visited_standard_nodes = set()
+    visited_intermediate_nodes = set()
 
     max_cost = 0
 
-    while not open_nodes.empty():
-        f, _, _, id, node = open_nodes.get()
+    # Sampled to track the memory use per node
+    memory_samples = 0
+    memory_total = 0
+
+    while open_nodes:
+        if solve_stats is not None and \
+                len(open_nodes) > solve_stats.peak_open:
+            solve_stats.peak_open = len(open_nodes)
+
+        f, _, _, id, node = open_nodes.pop()
         conflicts = node.conflicts
         h = node.heuristic
 
-        logger.debug(
-            f"\n==> At node #{id} (f = {f}, h = {node.heuristic}, g = {node.cost})")
+        if debug:
+            logger.debug(f"\n==> At node #{id} (f = {f}, h = {node.heuristic}, "
+                         f"g = {node.cost})")
 
         if node.is_standard():
-            pos_tuple = node.standard_hash()
-            if pos_tuple in visited_standard_nodes:
+            state = node.standard_hash()
+            visited_nodes = visited_standard_nodes
+        else:
+            state = node.intermediate_hash()
+            visited_nodes = visited_intermediate_nodes
+
+        if state in visited_nodes:
+            if debug:
                 logger.debug("    skip")
-                continue
-            else:
-                visited_standard_nodes.add(pos_tuple)
+            if tracer is not None:
+                tracer.skip(id)
+            if solve_stats is not None:
+                solve_stats.duplicates += 1
+            continue
+        else:
+            visited_nodes.add(state)
 
-        for agent in range(node.grid.agents):
-            logger.debug(f"Agent {agent} is at {node.positions[agent]}")
-            logger.debug(f"        visited {node.visited_waypoints[agent]} ")
+        if solve_stats is not None:
+            solve_stats.expanded += 1
+        if tracer is not None:
+            tracer.expand(id)
+
+        if debug:
+            for agent in range(node.grid.agents):
+                logger.debug(f"Agent {agent} is at {node.positions[agent]}")
+                logger.debug(f"        visited "
+                             f"{node.visited_waypoints[agent]:b} ")
 
         if node.cost > max_cost:
             max_cost = node.f
 
-        if node_id % 1000 == 0:
-            completed_perc = round(
-                (node_id - open_nodes.qsize()) / open_nodes.qsize() * 100)
-            logger.info(f"\rMax cost: {f}, queue length: {open_nodes.qsize()} "
-                        f"{completed_perc}%",
+        if info and memory_samples and node_id % 1000 == 0:
+            queue_length = len(open_nodes)
+            logger.info(f"\rMax cost: {f}, queue length: {queue_length}, "
+                        f"{node_id} generated, "
+                        f"{memory_total // memory_samples} bytes/node",
                         end="")
 
         # Stop if the cost has been exceeded in case of illegal moves
@@ -74,49 +153,297 @@ def solve_od(grid) -> PathSet:
                 return
 
         if node.all_done():
-            logger.info("")
+            if memory_samples:
+                logger.info(f"\n{node_id} nodes, "
+                            f"{memory_total // memory_samples} bytes/node")
             return create_solution(grid, node)
 
-        for new_node in node.expand():
-            pc = grid.options["pc"]
+        if solve_stats is None:
+            new_nodes = node.expand()
+        else:
+            new_nodes = solve_stats.expand(node.expand)
+            solve_stats.generated += len(new_nodes)
+
+        for new_node in new_nodes:
             p1 = new_node.conflicts if pc else new_node.heuristic
             p2 = new_node.heuristic if pc else new_node.conflicts
             item = (new_node.f, p1, p2, node_id, new_node)
 
-            logger.debug(f"    + #{node_id} h = {new_node.heuristic}, "
-                         f"g = {new_node.cost} at {new_node.positions} with {new_node.visited_waypoints}")
+            if debug:
+                logger.debug(f"    + #{node_id} h = {new_node.heuristic}, "
+                             f"g = {new_node.cost} at {new_node.positions} "
+                             f"with {new_node.visited_waypoints}")
+            if tracer is not None:
+                tracer.generate(node_id, id, new_node)
+            if sample_memory and node_id % MEMORY_SAMPLE_INTERVAL == 1:
+                size = new_node.memory_size(node)
+                memory_samples += 1
+                memory_total += size
+                if solve_stats is not None:
+                    solve_stats.memory_samples += 1
+                    solve_stats.memory_total += size
+
+            node_id += 1
+            open_nodes.push(item)
+
+    logger.info("They never made it...")
+
+
+@timed_search
+def solve_pea(grid) -> PathSet:
+    """
+    Solves the MAPFW problem for a given grid with enhanced partial expansion
+    on top of operator decomposition. A node only generates the children
+    with an f-value equal to its stored F, and goes back into the open list
+    with the next F of its children, so children with high f-values are
+    never created unless needed.
+    :return: PathSet solution
+    """
+
+    solve_stats = grid.stats
+    open_nodes = OPEN_LISTS[grid.options["queue"]]()
+    if solve_stats is not None:
+        open_nodes = solve_stats.instrument(grid, open_nodes)
+
+    node_id = 0
+    root = grid.root_node()
+    open_nodes.push((root.f, 0, 0, node_id, root))
+    node_id += 1
+
+    visited_standard_nodes = set()
+    visited_intermediate_nodes = set()
+
+    pc = grid.options["pc"]
+
+    while open_nodes:
+        if solve_stats is not None and \
+                len(open_nodes) > solve_stats.peak_open:
+            solve_stats.peak_open = len(open_nodes)
+
+        stored_f, p1, p2, _, node = open_nodes.pop()
+
+        # Only check the closed lists when the node is popped for the first
+        # time, later pops are its next partial expansions
+        if stored_f == node.f:
+            if node.is_standard():
+                state = node.standard_hash()
+                visited_nodes = visited_standard_nodes
+            else:
+                state = node.intermediate_hash()
+                visited_nodes = visited_intermediate_nodes
+
+            if state in visited_nodes:
+                if solve_stats is not None:
+                    solve_stats.duplicates += 1
+                continue
+            visited_nodes.add(state)
+
+        # Stop if the cost has been exceeded in case of illegal moves
+        if grid.illegal_moves is not None:
+            if stored_f > len(grid.illegal_moves) - 1:
+                logger.info("Return due to rising costs!")
+                return
+
+        if node.all_done():
+            logger.info(f"{node_id} nodes generated")
+            return create_solution(grid, node)
 
+        if solve_stats is None:
+            new_nodes, next_delta = node.expand_partial(stored_f - node.f)
+        else:
+            solve_stats.expanded += 1
+            new_nodes, next_delta = solve_stats.expand(node.expand_partial,
+                                                       stored_f - node.f)
+            solve_stats.generated += len(new_nodes)
+        for new_node in new_nodes:
+            new_p1 = new_node.conflicts if pc else new_node.heuristic
+            new_p2 = new_node.heuristic if pc else new_node.conflicts
+            open_nodes.push((new_node.f, new_p1, new_p2, node_id, new_node))
+            if solve_stats is not None and \
+                    node_id % MEMORY_SAMPLE_INTERVAL == 1:
+                solve_stats.memory_samples += 1
+                solve_stats.memory_total += new_node.memory_size(node)
+            node_id += 1
+
+        if next_delta is not None:
+            open_nodes.push((node.f + next_delta, p1, p2, node_id, node))
             node_id += 1
-            open_nodes.put(item)
 
     logger.info("They never made it...")
 
 
+# Searches for a single group, by the "search" option
+SEARCHES = {
+    "od": solve_od,
+    "pea": solve_pea,
+}
+
+
+def search(grid) -> PathSet:
+    return SEARCHES[grid.options["search"]](grid)
+
+
 def solve_od_group(grid, group):
     return solve_od(grid.copy(group))
 
 
+# Base grid of a worker process, shared once when the worker starts
+worker_grid: Optional[Grid] = None
+
+
+def start_worker(grid: Grid):
+    global worker_grid
+    worker_grid = grid
+    search_trace.disable()
+
+
+def solve_group_in_worker(agents: List[int]) -> PathSet:
+    group = Group(agents, worker_grid)
+    group.solve_with(search)
+    return group.solution
+
+
+def find_alt_in_worker(groups: List[Group], index: int,
+                       other_index: int) -> Optional[PathSet]:
+    """
+    Find an alternative solution for one of the groups, given all the groups
+    as they are in the CAT.
+    """
+
+    for group in groups:
+        group.base_grid = worker_grid
+    cat = CAT(worker_grid.agents, groups)
+
+    group = groups[index]
+    if group.find_non_conflicting_alt(search, groups[other_index], cat):
+        return group.solution
+
+
 def solve_od_id(grid) -> PathSet:
+    """
+    Solves the MAPFW problem with independence detection. With the "workers"
+    option above one, independent searches run in a process pool. The
+    results are the same for any number of workers. The distance fields are
+    computed first, in a separately timed setup stage.
+    """
+
+    start_time = time.time()
+    grid.prepare()
+    setup_time = time.time() - start_time
+    logger.info(f"Setup took {setup_time:.3f} sec")
+    if grid.stats is not None:
+        grid.stats.setup_time += setup_time
+
+    workers = grid.options["workers"]
+    start_time = time.time()
+    if workers <= 1:
+        solution = run_od_id(grid, None)
+    else:
+        with ProcessPoolExecutor(workers, initializer=start_worker,
+                                 initargs=(grid,)) as pool:
+            solution = run_od_id(grid, pool)
+    logger.info(f"Search took {time.time() - start_time:.3f} sec")
+
+    return solution
+
+
+class IDStats:
+    """
+    Counts of the independence detection so far: merged groups, searches
+    for a group after the first plans, and the largest group.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+        self.merges = 0
+        self.replans = 0
+        self.max_group_size = 1
+
+    def __str__(self):
+        return f"{self.merges} merges, {self.replans} replans, " \
+               f"max group size {self.max_group_size}"
+
+
+def find_alternatives(pool: Optional[ProcessPoolExecutor], groups,
+                      group_a: Group, group_b: Group, cat: CAT,
+                      stats: IDStats) -> bool:
+    """
+    Try to find an alternative for group A, and if that fails for group B.
+    With a pool, B is searched alongside A in case A fails, and dropped if
+    A succeeds. Only the searches whose result is used count as replans,
+    as without a pool.
+    """
+
+    # fill illegal move table with the current paths for G2
+    # find another set of paths with the same cost for G1
+    logger.info(f"Trying to find an alt for {group_a.agents}")
+
+    if pool is not None:
+        index_a, index_b = groups.index(group_a), groups.index(group_b)
+        alt_a = pool.submit(find_alt_in_worker, groups, index_a, index_b)
+        alt_b = pool.submit(find_alt_in_worker, groups, index_b, index_a)
+        stats.replans += 1
+
+        if alt_a.result() is not None:
+            # Stops B if it has not started, otherwise its result is ignored
+            alt_b.cancel()
+            group_a.solution = alt_a.result()
+            return True
+
+        stats.replans += 1
+
+        logger.info(f"Trying to find an alt for {group_b.agents}")
+        if alt_b.result() is not None:
+            group_b.solution = alt_b.result()
+            return True
+
+        return False
+
+    stats.replans += 1
+    if group_a.find_non_conflicting_alt(search, group_b, cat):
+        return True
+
+    # if failed to find such a set then
+    # fill illegal move table with the current paths for G1
+    # find another set of paths with the same cost for G2
+    logger.info(f"Trying to find an alt for {group_b.agents}")
+    stats.replans += 1
+    return group_b.find_non_conflicting_alt(search, group_a, cat)
+
+
+def run_od_id(grid, pool: Optional[ProcessPoolExecutor]) -> PathSet:
     solved_group_conflicts = set()
 
     # Assign each agent to a group
     groups = [Group([n], grid) for n in range(grid.agents)]
 
     # Plan a path for each group
+    start_time = time.time()
     logger.info("Planning path for each agent...")
-    for group in groups:
-        group.solve_with(solve_od)
+    if pool is None:
+        for group in groups:
+            group.solve_with(search)
+    else:
+        solutions = pool.map(solve_group_in_worker,
+                             [group.agents for group in groups])
+        for group, solution in zip(groups, solutions):
+            group.solution = solution
     logger.info(" ... done")
+    planning_time = time.time() - start_time
+    start_time = time.time()
 
     # fill conflict avoidance table with every path
     cat = CAT(grid.agents, groups)
+    conflict_index = ConflictIndex()
+    stats = IDStats()
 
     # until no conflicts occur
     while True:
         # Simulate execution of all paths until a conflict between two groups
-        # G1 and G2 occurs
+        # G1 and G2 occurs, or pick the pair by the conflict policy
         logger.info("Simulating for conflicts ... ", "")
-        conflicts = Group.conflicting(groups)
+        conflicts = Group.conflicting(groups, conflict_index,
+                                      grid.options["conflict"])
         if conflicts is None:
             logger.info("none")
             break
@@ -128,22 +455,8 @@ def solve_od_id(grid) -> PathSet:
         # if these two groups have not conflicted before
         if group_combo_hash not in solved_group_conflicts:
             solved_group_conflicts.add(group_combo_hash)
-
-            # fill illegal move table with the current paths for G2
-            # find another set of paths with the same cost for G1
-            logger.info(f"Trying to find an alt for {group_a.agents}")
-            resolved_conflict |= group_a.find_non_conflicting_alt(solve_od,
-                                                                  group_b, cat)
-
-            # if failed to find such a set then
-            if not resolved_conflict:
-                # fill illegal move table with the current paths for G1
-
-                # find another set of paths with the same cost for G2
-                logger.info(f"Trying to find an alt for {group_b.agents}")
-                resolved_conflict |= group_b.find_non_conflicting_alt(solve_od,
-                                                                      group_a,
-                                                                      cat)
+            resolved_conflict = find_alternatives(pool, groups, group_a,
+                                                  group_b, cat, stats)
 
         # if failed to find an alternate set of paths for G1 and G2 then
         if not resolved_conflict:
@@ -154,16 +467,57 @@ def solve_od_id(grid) -> PathSet:
             groups.remove(group_b)
             groups.append(new_group)
 
+            # the new group plans around the other groups only
+            cat.update(groups)
+
             # cooperatively plan new group
-            new_group.solve_with(solve_od, cat=cat)
+            new_group.solve_with(search, cat=cat)
+            stats.merges += 1
+            stats.replans += 1
+            stats.max_group_size = max(stats.max_group_size,
+                                       len(new_group.agents))
         else:
             logger.info("Conflict was resolved")
 
         # update conflict avoidance table with changes made to paths
         cat.update(groups)
 
+        stats.iterations += 1
+        logger.info(f"ID iteration {stats.iterations}: {stats}")
+
+    if grid.stats is not None:
+        grid.stats.planning_time = planning_time
+        grid.stats.id_time = time.time() - start_time
+        grid.stats.id_iterations = stats.iterations
+        grid.stats.merges = stats.merges
+        grid.stats.replans = stats.replans
+
+    hits, misses = grid.heuristic_cache_counts()
+    logger.info(f"Heuristic cache: {hits} hits, {misses} misses")
+
     # solution ← paths of all groups combined
     solution = Group.combined_solution(groups)
 
     # return solution
     return solution
+
+
+# Solvers for a whole problem, by name
+SOLVERS = {
+    "id": solve_od_id,
+    "cbs": solve_cbs,
+}
+
+
+def solve_with_stats(grid, solve=solve_od_id, timers: bool = False) \
+        -> Tuple[PathSet, SolveStats]:
+    """
+    Solve a problem while collecting the stats of the searches.
+    :param timers: also time the heuristic, expansions and open list
+    """
+
+    grid.stats = SolveStats(timers)
+    try:
+        return solve(grid), grid.stats
+    finally:
+        grid.stats = None
@@ -0,0 +1,120 @@
+from time import perf_counter
+
+
+class SolveStats:
+    """
+    Timings and counters of solving a single problem. Only collected when
+    set as the stats of the grid, and only for the searches in this process.
+    The timers of the heuristic, expansions and open list operations are
+    optional, as timing every call slows the search down.
+    """
+
+    def __init__(self, timers: bool = False):
+        self.timers = timers
+
+        # Seconds spent per phase of solve_od_id
+        self.setup_time = 0.0
+        self.planning_time = 0.0
+        self.id_time = 0.0
+
+        # Independence detection, see solver.IDStats
+        self.id_iterations = 0
+        self.merges = 0
+        self.replans = 0
+
+        # Conflict-Based Search, whose low level searches count below
+        self.high_level_nodes = 0
+
+        # Summed over all the searches
+        self.searches = 0
+        self.search_time = 0.0
+        self.max_group_size = 0
+        self.generated = 0
+        self.expanded = 0
+        self.duplicates = 0
+        self.peak_open = 0
+
+        # Sampled sizes of generated nodes, see solver.MEMORY_SAMPLE_INTERVAL
+        self.memory_samples = 0
+        self.memory_total = 0
+
+        # Only with timers, the expansions include the heuristic
+        self.heuristic_time = 0.0
+        self.expand_time = 0.0
+        self.queue_time = 0.0
+
+    def instrument(self, grid, open_list):
+        """
+        Time the heuristic of a grid and the operations on an open list, if
+        the timers are on.
+        :return: the open list to use
+        """
+
+        if not self.timers:
+            return open_list
+
+        if "heuristic" not in grid.__dict__:
+            grid.heuristic = self.timed_heuristic(grid.heuristic)
+
+        return TimedOpenList(open_list, self)
+
+    def timed_heuristic(self, heuristic):
+        def timed(agent, position, visited_waypoints):
+            start_time = perf_counter()
+            value = heuristic(agent, position, visited_waypoints)
+            self.heuristic_time += perf_counter() - start_time
+            return value
+
+        return timed
+
+    def expand(self, expand, *args):
+        """
+        Call an expansion of a node, timed if the timers are on.
+        """
+
+        if not self.timers:
+            return expand(*args)
+
+        start_time = perf_counter()
+        result = expand(*args)
+        self.expand_time += perf_counter() - start_time
+        return result
+
+    def to_dict(self):
+        data = dict(self.__dict__)
+        del data["timers"]
+        if not self.timers:
+            for timer in ["heuristic_time", "expand_time", "queue_time"]:
+                del data[timer]
+
+        data["nodes_per_second"] = self.expanded / self.search_time \
+            if self.search_time else 0
+
+        del data["memory_samples"], data["memory_total"]
+        data["bytes_per_node"] = self.memory_total // self.memory_samples \
+            if self.memory_samples else 0
+        return data
+
+
+class TimedOpenList:
+    """
+    Open list that adds the time of its operations to the queue time.
+    """
+
+    def __init__(self, open_list, stats: SolveStats):
+        self.open_list = open_list
+        self.stats = stats
+
+    def push(self, item):
+        start_time = perf_counter()
+        self.open_list.push(item)
+        self.stats.queue_time += perf_counter() - start_time
+
+    def pop(self):
+        start_time = perf_counter()
+        item = self.open_list.pop()
+        self.stats.queue_time += perf_counter() - start_time
+        return item
+
+    def __len__(self):
+        return len(self.open_list)
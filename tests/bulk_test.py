@@ -0,0 +1,28 @@
+import random
+import unittest
+
+import bulk
+import progressive
+
+
+class BulkTest(unittest.TestCase):
+
+    def test_stats_setup_time(self):
+        random.seed(0)
+        grid_data = progressive.save_generate_grid(3, 2, 12).data()
+
+        for solver_name in ["id", "cbs"]:
+            runtime, stats = bulk.run_single_from_data(grid_data, solver_name)
+            self.assertGreater(stats["setup_time"], 0)
+            self.assertGreater(stats["expanded"], 0)
+            self.assertGreater(stats["generated"], 0)
+            self.assertGreater(stats["search_time"], 0)
+            self.assertGreater(stats["nodes_per_second"], 0)
+            if solver_name == "id":
+                self.assertGreater(stats["bytes_per_node"], 0)
+            else:
+                self.assertGreater(stats["high_level_nodes"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
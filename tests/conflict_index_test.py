@@ -0,0 +1,72 @@
+import unittest
+from collections import deque
+from random import Random
+
+from conflict_index import ConflictIndex
+from path import Path
+from pathset import PathSet
+
+
+class ConflictIndexTest(unittest.TestCase):
+
+    @staticmethod
+    def random_path(rng: Random, width: int, height: int):
+        x, y = rng.randrange(width), rng.randrange(height)
+        path = [x + y * width]
+        for _ in range(rng.randint(0, 8)):
+            dx, dy = rng.choice([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)])
+            x = min(max(x + dx, 0), width - 1)
+            y = min(max(y + dy, 0), height - 1)
+            path.append(x + y * width)
+        return path
+
+    @staticmethod
+    def merged(paths):
+        path_set = PathSet(len(paths))
+        path_set.paths = [Path(deque(path)) for path in paths]
+        path_set.pad()
+        return path_set
+
+    def test_single_conflict(self):
+        index = ConflictIndex()
+        index.add_path(0, [0, 1, 2])
+        index.add_path(1, [3, 2, 1])
+        self.assertEqual((1, 1, 0, 1), index.first_conflict())
+
+    def test_parked_agent(self):
+        index = ConflictIndex()
+        index.add_path(0, [0, 1])
+        index.add_path(1, [3, 2, 2, 1, 0])
+        self.assertEqual((0, 3, 0, 1), index.first_conflict())
+
+        index.remove_path(1)
+        self.assertIsNone(index.first_conflict())
+
+    def test_same_as_path_set(self):
+        rng = Random(42)
+        for _ in range(500):
+            width, height = rng.randint(2, 4), rng.randint(2, 4)
+            paths = [self.random_path(rng, width, height)
+                     for _ in range(rng.randint(2, 5))]
+
+            index = ConflictIndex()
+            for agent, path in enumerate(paths):
+                index.add_path(agent, path)
+
+            # Replace a path to test the incremental update
+            agent = rng.randrange(len(paths))
+            paths[agent] = self.random_path(rng, width, height)
+            index.remove_path(agent)
+            index.add_path(agent, paths[agent])
+
+            expected = self.merged(paths).conflicts()
+            conflict = index.first_conflict()
+            if expected is None:
+                self.assertIsNone(conflict)
+            else:
+                self.assertIsNotNone(conflict)
+                self.assertEqual(expected, set(conflict[2:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
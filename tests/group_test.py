@@ -0,0 +1,53 @@
+import unittest
+from collections import deque
+
+from conflict_index import ConflictIndex
+from group import Group
+from path import Path
+from pathset import PathSet
+
+
+class GroupTest(unittest.TestCase):
+
+    @staticmethod
+    def solved_groups():
+        paths = [[0, 1, 2], [3, 1, 7, 8, 9], [6, 6, 7, 8, 9]]
+        groups = []
+        for agent, path in enumerate(paths):
+            group = Group([agent], None)
+            group.solution = PathSet(1)
+            group.solution.paths = [Path(deque(path))]
+            groups.append(group)
+        return groups
+
+    def test_conflict_counts(self):
+        groups = GroupTest.solved_groups()
+        index = ConflictIndex()
+        index.update(groups)
+        # Agents 1 and 2 share cells 7, 8 and 9, moving along together
+        self.assertEqual({(0, 1): (1, (0, 1, 0, 1)),
+                          (1, 2): (3, (0, 2, 1, 2))},
+                         Group.conflict_counts(groups, index))
+
+    def test_conflict_counts_swap(self):
+        groups = GroupTest.solved_groups()
+        groups[0].solution.paths = [Path(deque([0, 1, 2, 5]))]
+        groups[2].solution.paths = [Path(deque([6, 6, 5, 2]))]
+        index = ConflictIndex()
+        index.update(groups)
+        self.assertEqual({(0, 1): (1, (0, 1, 0, 1)),
+                          (0, 2): (1, (1, 2, 0, 2))},
+                         Group.conflict_counts(groups, index))
+
+    def test_policies(self):
+        groups = GroupTest.solved_groups()
+        self.assertEqual((groups[0], groups[1]),
+                         Group.conflicting(groups, policy="first"))
+        self.assertEqual((groups[1], groups[2]),
+                         Group.conflicting(groups, policy="most"))
+        self.assertEqual((groups[0], groups[1]),
+                         Group.conflicting(groups, policy="cheapest"))
+
+
+if __name__ == '__main__':
+    unittest.main()
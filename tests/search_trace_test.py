@@ -0,0 +1,52 @@
+import os
+import random
+import tempfile
+import unittest
+
+import progressive
+import search_trace
+import solver
+
+
+class SearchTraceTest(unittest.TestCase):
+
+    def test_replay(self):
+        random.seed(3)
+        grid = progressive.save_generate_grid(2, 2, 6)
+
+        path = os.path.join(tempfile.mkdtemp(), "trace.bin")
+        search_trace.start(path)
+        try:
+            solution = solver.solve_od(grid)
+        finally:
+            search_trace.stop()
+
+        records = list(search_trace.read(path))
+        self.assertEqual(records[0], (search_trace.MAP, grid.w, grid.h,
+                                      grid.walls))
+        self.assertEqual(records[1][0], search_trace.SEARCH)
+        self.assertEqual(records[1][1:], (grid.starts, grid.goals, [
+            waypoints.ordered_waypoints for waypoints in grid.waypoints]))
+
+        nodes = dict()
+        expanded = []
+        for record in records[2:]:
+            if record[0] == search_trace.GENERATE:
+                kind, node_id, parent_id, g, h, positions, visited = record
+                self.assertTrue(parent_id == search_trace.ROOT_PARENT or
+                                parent_id in expanded)
+                nodes[node_id] = g, h, positions, visited
+            elif record[0] == search_trace.EXPAND:
+                self.assertIn(record[1], nodes)
+                expanded.append(record[1])
+
+        # The last expanded node is the goal
+        g, h, positions, visited = nodes[expanded[-1]]
+        self.assertEqual(h, 0)
+        self.assertEqual(list(positions), grid.goals)
+        cost = sum(len(path.unpadded()) - 1 for path in solution.paths)
+        self.assertEqual(g, cost)
+
+
+if __name__ == '__main__':
+    unittest.main()
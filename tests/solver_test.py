@@ -0,0 +1,76 @@
+import random
+import unittest
+
+import cbs
+import progressive
+import solver
+
+
+class SolverTest(unittest.TestCase):
+
+    @staticmethod
+    def cost(solution):
+        return sum(len(path.unpadded()) - 1 for path in solution.paths)
+
+    def test_pea_same_cost(self):
+        for seed, (agents, waypoints, size) in enumerate(
+                [(2, 2, 8), (3, 1, 8), (2, 3, 6), (3, 2, 7)]):
+            costs = []
+            for search in ["od", "pea"]:
+                random.seed(seed)
+                grid = progressive.save_generate_grid(agents, waypoints, size)
+                grid.options["search"] = search
+                costs.append(self.cost(solver.solve_od_id(grid)))
+
+            self.assertEqual(costs[0], costs[1])
+
+    def test_pea_bounded_operators(self):
+        for seed, (agents, waypoints, size) in enumerate(
+                [(2, 2, 8), (3, 1, 8), (2, 3, 6)]):
+            costs = []
+            for capacity in [100000, 10, 0]:
+                random.seed(seed)
+                grid = progressive.save_generate_grid(agents, waypoints, size)
+                grid.options["search"] = "pea"
+                grid.options["heuristic_cache"] = capacity
+                costs.append(self.cost(solver.solve_od_id(grid)))
+                if capacity:
+                    self.assertLessEqual(
+                        max(len(waypoint_map.operators)
+                            for waypoint_map in grid.waypoints
+                            if waypoint_map.operators is not None), capacity)
+
+            self.assertEqual(len(set(costs)), 1)
+
+    def test_workers_same_replans(self):
+        for seed in [2, 4, 7]:
+            results = []
+            for workers in [1, 2]:
+                random.seed(seed)
+                grid = progressive.save_generate_grid(4, 1, 8)
+                grid.options["workers"] = workers
+                solution, stats = solver.solve_with_stats(grid)
+                results.append((self.cost(solution), stats.replans,
+                                stats.merges))
+
+            self.assertEqual(results[0], results[1])
+
+    def test_cbs_same_cost(self):
+        for seed, (agents, waypoints, size) in enumerate(
+                [(2, 2, 8), (3, 1, 8), (3, 2, 7), (4, 2, 10)]):
+            for ordered in [False, True]:
+                costs = []
+                for solve in [solver.solve_od_id, cbs.solve_cbs]:
+                    random.seed(seed)
+                    grid = progressive.save_generate_grid(agents, waypoints,
+                                                          size)
+                    grid.options["ord"] = ordered
+                    solution = solve(grid)
+                    self.assertIsNone(solution.conflicts())
+                    costs.append(self.cost(solution))
+
+                self.assertEqual(costs[0], costs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from random import Random
+
+import wavefront
+from grid import Grid
+
+
+@unittest.skipIf(wavefront.np is None, "NumPy is not installed")
+class WavefrontTest(unittest.TestCase):
+
+    def test_same_as_breadth_first(self):
+        rng = Random(42)
+        for _ in range(50):
+            width, height = rng.randint(1, 12), rng.randint(1, 12)
+            grid = Grid(width, height)
+            for _ in range(rng.randint(0, width * height // 3)):
+                grid.add_wall(rng.randrange(width), rng.randrange(height))
+
+            sources = [rng.randrange(grid.cells) for _ in range(3)]
+            table = wavefront.neighbour_table(grid.walls, width, height)
+            fields = wavefront.distance_fields(table, sources).tolist()
+
+            for source, field in zip(sources, fields):
+                expected = grid.breadth_first_distances(source)
+                self.assertEqual(expected,
+                                 [d if d >= 0 else None for d in field])
+
+
+if __name__ == '__main__':
+    unittest.main()
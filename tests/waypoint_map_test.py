@@ -16,54 +16,71 @@ class WaypointMapTest(unittest.TestCase):
         for x, y in waypoints:
             grid.add_waypoint(0, x, y)
 
-        map = WaypointMap(grid, (3, 3))
+        map = WaypointMap(grid, grid.cell(3, 3))
         for x, y in waypoints:
-            map.add_waypoint(x, y)
+            map.add_waypoint(grid.cell(x, y))
 
         return map
 
     def test_ordered_1(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(10, map.heuristic((3,1), {(2,0),(1,5)}, {
+        cell = map.grid.cell
+        self.assertEqual(10, map.heuristic(cell(3, 1), map.mask({cell(2, 0), cell(1, 5)}), {
             "ord": True
         }))
 
     def test_ordered_2(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(6, map.heuristic((3,1), {(2,0),(1,5),(5,2)}, {
+        cell = map.grid.cell
+        self.assertEqual(6, map.heuristic(cell(3, 1), map.mask({cell(2, 0), cell(1, 5), cell(5, 2)}), {
             "ord": True
         }))
 
     def test_ordered_3(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(2, map.heuristic((3,1), {(2,0),(1,5),(5,2),(1,2)}, {
+        cell = map.grid.cell
+        self.assertEqual(2, map.heuristic(cell(3, 1), map.mask({cell(2, 0), cell(1, 5), cell(5, 2), cell(1, 2)}), {
             "ord": True
         }))
 
     def test_ordered_4(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(20, map.heuristic((3,1), {(2,0)}, {
+        cell = map.grid.cell
+        self.assertEqual(20, map.heuristic(cell(3, 1), map.mask({cell(2, 0)}), {
             "ord": True
         }))
 
     def test_ordered_5(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(22, map.heuristic((3,1), set(), {
+        cell = map.grid.cell
+        self.assertEqual(22, map.heuristic(cell(3, 1), 0, {
             "ord": True
         }))
 
     def test_mst_tsp(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(11, map.heuristic_mst((0, 0), {(1, 5)}))
+        cell = map.grid.cell
+        self.assertEqual(11, map.heuristic_mst(cell(0, 0), map.mask({cell(1, 5)})))
 
     def test_mst_tsp_all(self):
         map = WaypointMapTest.example_map()
-        self.assertEqual(14, map.heuristic_mst((0, 0), set()))
+        cell = map.grid.cell
+        self.assertEqual(14, map.heuristic_mst(cell(0, 0), 0))
+
+    def test_cached(self):
+        map = WaypointMapTest.example_map()
+        cell = map.grid.cell
+        options = {"ord": False, "tsp": "dyn", "heuristic_cache": 10}
+        expected = map.heuristic_tsp(cell(0, 0), map.mask({cell(1, 5)}))
+        for _ in range(2):
+            self.assertEqual(expected, map.heuristic(cell(0, 0), map.mask({cell(1, 5)}), options))
+        self.assertEqual((1, 1), (map.cache.hits, map.cache.misses))
 
     def test_smaller(self):
         map = WaypointMapTest.example_map()
-        self.assertLessEqual(map.heuristic_mst((0, 0), set()),
-                             map.heuristic_tsp((0, 0), set()))
+        cell = map.grid.cell
+        self.assertLessEqual(map.heuristic_mst(cell(0, 0), 0),
+                             map.heuristic_tsp(cell(0, 0), 0))
 
     def test_smaller_random(self):
         for n in range(1000):
@@ -81,12 +98,12 @@ class WaypointMapTest(unittest.TestCase):
             for x, y in waypoints:
                 grid.add_waypoint(0, x, y)
 
-            map = WaypointMap(grid, goal)
+            map = WaypointMap(grid, grid.cell(*goal))
             for x, y in waypoints:
-                map.add_waypoint(x, y)
+                map.add_waypoint(grid.cell(x, y))
 
-            mst = map.heuristic_mst(pos, set())
-            tsp = map.heuristic_tsp(pos, set())
+            mst = map.heuristic_mst(grid.cell(*pos), 0)
+            tsp = map.heuristic_tsp(grid.cell(*pos), 0)
 
             if mst > tsp:
                 print(f"Failed test #{n}")
@@ -108,12 +125,13 @@ class WaypointMapTest(unittest.TestCase):
         for x, y in waypoints:
             grid.add_waypoint(0, x, y)
 
-        map = WaypointMap(grid, (4, 0))
+        map = WaypointMap(grid, grid.cell(4, 0))
         for x, y in waypoints:
-            map.add_waypoint(x, y)
+            map.add_waypoint(grid.cell(x, y))
 
         map = WaypointMapTest.example_map()
-        self.assertEqual(13, map.heuristic_mst((5, 1), set()))
+        cell = map.grid.cell
+        self.assertEqual(13, map.heuristic_mst(cell(5, 1), 0))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,81 @@
+"""
+Breadth first distance fields with NumPy. Each step expands the whole
+frontier at once, and several sources can be searched side by side.
+"""
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this many cells a plain breadth first search is faster
+MIN_CELLS = 128 * 128
+
+# Cells of all sources searched side by side, which limits the memory
+BATCH_CELLS = 1 << 22
+
+# Moves to the left, up, down and right as (dx, dy)
+MOVES = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+
+
+def neighbour_table(walls: Sequence[bool], width: int,
+                    height: int) -> "np.ndarray":
+    """
+    Open neighbours of every cell as a cells x 4 array, padded with -1.
+
+    >>> neighbour_table([False, True, False, False], 2, 2).tolist()
+    [[-1, -1, 2, -1], [0, -1, 3, -1], [-1, 0, -1, 3], [2, -1, -1, -1]]
+    """
+
+    cells = np.arange(width * height)
+    xs, ys = cells % width, cells // width
+    open_cells = ~np.asarray(walls, dtype=bool)
+
+    table = np.full((width * height, len(MOVES)), -1, dtype=np.int64)
+    for column, (dx, dy) in enumerate(MOVES):
+        inside = (xs + dx >= 0) & (xs + dx < width) & \
+                 (ys + dy >= 0) & (ys + dy < height)
+        neighbours = cells[inside] + dx + dy * width
+        neighbours = np.where(open_cells[neighbours], neighbours, -1)
+        table[inside, column] = neighbours
+
+    return table
+
+
+def distance_fields(table: "np.ndarray", sources: List[int]) -> "np.ndarray":
+    """
+    Distance from each source to every cell, as a sources x cells array with
+    -1 for unreachable cells.
+
+    >>> table = neighbour_table([False, True, False, False], 2, 2)
+    >>> distance_fields(table, [0, 3]).tolist()
+    [[0, -1, 1, 2], [2, -1, 1, 0]]
+    """
+
+    cells = len(table)
+    fields = np.full(len(sources) * cells, -1, dtype=np.int32)
+
+    # Cells of all searches are numbered source index * cells + cell
+    frontier = np.asarray(sources, dtype=np.int64) + \
+        np.arange(len(sources), dtype=np.int64) * cells
+    fields[frontier] = 0
+    distance = 1
+    last_candidate = np.empty(len(fields), dtype=np.int64)
+
+    while frontier.size:
+        frontier_cells = frontier % cells
+        neighbours = table[frontier_cells]
+        candidates = (neighbours + (frontier - frontier_cells)[:, None])[
+            neighbours >= 0]
+        candidates = candidates[fields[candidates] < 0]
+
+        # Keep one candidate for a cell reached from several frontier
+        # cells: the one whose position survived the writes
+        order = np.arange(candidates.size)
+        last_candidate[candidates] = order
+        frontier = candidates[last_candidate[candidates] == order]
+        fields[frontier] = distance
+        distance += 1
+
+    return fields.reshape(len(sources), cells)
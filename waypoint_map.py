@@ -1,170 +1,243 @@
 import time
-from queue import Queue
+from array import array
 from math import factorial
-from typing import Tuple, Set, Optional, Dict
+from typing import Optional, Dict, List, Tuple
 
 import logger
-from mst import MST
+from lru import LRUCache
+from mst import dense_cost
 
 
 class WaypointMap:
 
-    def __init__(self, grid, goal: Tuple[int, int]):
+    def __init__(self, grid, goal: int):
         self.grid = grid
         self.goal = goal
         self.waypoints = set()
         self.ordered_waypoints = []
+        self.bits: Dict[int, int] = dict()
+        self.full_mask = 0
+
+        # Distance fields of the goal and waypoints, fetched in prepare
         self.distance_maps = dict()
-        self.goal_heuristics = grid.backtrack_heuristics(goal)
-        self.cache = dict()
-        self.shared_cache = dict()
+        self.goal_heuristics: Optional[List[Optional[int]]] = None
+
+        # Distance tables by waypoint index, see prepare
+        self.between: List[List[int]] = []
+        self.to_goal: List[int] = []
+        self.ordered_tails: List[int] = []
+        self.cell_distances: Optional[List[Tuple[int, ...]]] = None
+        self.tsp_table: Optional[array] = None
+        self.mst_costs: Dict[int, int] = dict()
+
+        # Heuristics by visited mask and position, created on first use
+        self.cache: Optional[LRUCache] = None
+
+        # Moves sorted by f difference, by visited mask and position, see
+        # Grid.operators. Bounded like the heuristics, created on first use
+        self.operators: Optional[LRUCache] = None
+
+    def add_waypoint(self, waypoint: int):
+        """
+        Add a waypoint cell, which gets the next bit in the visited masks.
+        Adding the same waypoint twice has no effect.
+        """
+
+        if waypoint in self.bits:
+            return
 
-    def add_waypoint(self, x, y):
-        self.waypoints.add((x, y))
-        self.ordered_waypoints.append((x, y))
-        self.distance_maps[(x, y)] = self.grid.backtrack_heuristics((x, y))
+        self.bits[waypoint] = 1 << len(self.ordered_waypoints)
+        self.full_mask |= self.bits[waypoint]
+        self.waypoints.add(waypoint)
+        self.ordered_waypoints.append(waypoint)
+        self.cell_distances = None
+        self.tsp_table = None
+        self.mst_costs.clear()
+        self.cache = None
+        self.operators = None
+
+    def mask(self, waypoints) -> int:
+        """
+        Visited mask for a collection of waypoint cells.
+        """
+
+        mask = 0
+        for waypoint in waypoints:
+            mask |= self.bits[waypoint]
+        return mask
+
+    def prepare(self):
+        """
+        Tabulate the distances between the waypoints, from the waypoints to
+        the goal, and from every cell to each waypoint, by waypoint index.
+        Done on first use after waypoints were added, or by Grid.prepare.
+        """
 
-    def heuristic(self, position, visited_waypoints: Set[Tuple[int, int]],
-                  options):
+        ordered = self.ordered_waypoints
+        self.goal_heuristics = self.grid.backtrack_heuristics(self.goal)
+        for waypoint in ordered:
+            if waypoint not in self.distance_maps:
+                self.distance_maps[waypoint] = \
+                    self.grid.backtrack_heuristics(waypoint)
+
+        self.between = [[self.distance_maps[a][b] for b in ordered]
+                        for a in ordered]
+        self.to_goal = [self.goal_heuristics[wp] for wp in ordered]
+        self.cell_distances = list(zip(*(self.distance_maps[wp]
+                                         for wp in ordered)))
+
+        # From each waypoint via all the next ones to the goal
+        self.ordered_tails = self.to_goal[:]
+        for index in range(len(ordered) - 2, -1, -1):
+            self.ordered_tails[index] = self.between[index][index + 1] + \
+                                        self.ordered_tails[index + 1]
+
+    def heuristic(self, position, visited_waypoints: int, options):
         """
         Calculate the heuristic for an agent, given a current position and
-        a set of waypoints that have already been visited.
+        the mask of waypoints that have already been visited. The MST and
+        TSP estimates are kept in a bounded cache, sized by the
+        heuristic_cache option, where 0 disables it.
         """
 
+        if self.cell_distances is None:
+            self.prepare()
+
         # If already visited all the waypoints: straight to goal
-        x, y = position
-        if len(visited_waypoints) == len(self.waypoints):
-            return self.goal_heuristics[y][x]
+        if visited_waypoints == self.full_mask:
+            return self.goal_heuristics[position]
 
-        # Ordered waypoints: to next unvisited waypoint via all next to goal
+        # Ordered waypoints: to next unvisited waypoint via all next to goal.
+        # Waypoints are visited in bit order, so the mask is a prefix.
         if options["ord"]:
-            last_waypoint = self.ordered_waypoints[-1]
-            wpx, wpy = last_waypoint
-            waypoints_from_goal = 2
-            distance = self.goal_heuristics[wpy][wpx]
+            next_index = visited_waypoints.bit_length()
+            return self.cell_distances[position][next_index] + \
+                self.ordered_tails[next_index]
+
+        if options["heuristic_cache"] == 0:
+            return self.uncached_heuristic(position, visited_waypoints,
+                                           options)
 
-            while len(visited_waypoints) <= len(self.waypoints) - waypoints_from_goal:
-                waypoint = self.ordered_waypoints[len(self.waypoints) - waypoints_from_goal]
-                wpx, wpy = last_waypoint
-                distance += self.distance_maps[waypoint][wpy][wpx]
-                last_waypoint = waypoint
-                waypoints_from_goal += 1
+        if self.cache is None:
+            self.cache = LRUCache(options["heuristic_cache"])
 
-            return distance + self.distance_maps[last_waypoint][y][x]
+        key = visited_waypoints * self.grid.cells + position
+        heuristic = self.cache.get(key)
+        if heuristic is None:
+            heuristic = self.uncached_heuristic(position, visited_waypoints,
+                                                options)
+            self.cache.put(key, heuristic)
 
+        return heuristic
+
+    def uncached_heuristic(self, position, visited_waypoints: int, options):
         if options["tsp"] == "dyn":
             return self.heuristic_tsp(position, visited_waypoints)
 
         return self.heuristic_mst(position, visited_waypoints)
 
-    def heuristic_mst(self, position, visited_waypoints: Set[Tuple[int, int]]):
-        x, y = position
+    def unvisited(self, visited_waypoints: int) -> List[int]:
+        """
+        Indices of the waypoints that are not in the mask.
+        """
 
-        if len(visited_waypoints) == len(self.waypoints):
-            return self.goal_heuristics[y][x]
+        return [index for index in range(len(self.ordered_waypoints))
+                if not visited_waypoints >> index & 1]
 
-        to_visit = self.waypoints - visited_waypoints
+    def heuristic_mst(self, position, visited_waypoints: int):
+        if self.cell_distances is None:
+            self.prepare()
 
-        mst = MST()
-        mst.add_vertices(to_visit)
-        mst.add_vertex(position)
-        mst.add_vertex(self.goal)
+        if visited_waypoints == self.full_mask:
+            return self.goal_heuristics[position]
 
-        for wp in to_visit:
-            wpx, wpy = wp
-            mst.add_edge(position, wp, self.distance_maps[wp][y][x])
-            mst.add_edge(self.goal, wp, self.goal_heuristics[wpy][wpx])
+        to_visit = self.unvisited(visited_waypoints)
+        distances = self.cell_distances[position]
 
-        # Between waypoints
-        for i, wpa in enumerate(to_visit):
-            for j, wpb, in enumerate(to_visit):
-                if i <= j:
-                    continue
-                xb, yb = wpb
-                mst.add_edge(wpa, wpb, self.distance_maps[wpa][yb][xb])
+        # Any route visits a waypoint first, then spans the rest and the goal
+        return self.subset_mst(visited_waypoints) + \
+            min(distances[wp] for wp in to_visit)
 
-        return mst.cost()
+    def subset_mst(self, visited_waypoints: int) -> int:
+        """
+        Cost of the minimum spanning tree of the unvisited waypoints and the
+        goal, which does not depend on the position.
+        """
 
-    def heuristic_tsp(self, position, visited_waypoints: Set[Tuple[int, int]]):
-        x, y = position
+        cost = self.mst_costs.get(visited_waypoints)
+        if cost is None:
+            to_visit = self.unvisited(visited_waypoints)
+            weights = [[self.between[wpa][wpb] for wpb in to_visit] +
+                       [self.to_goal[wpa]] for wpa in to_visit]
+            weights.append([self.to_goal[wp] for wp in to_visit] + [0])
 
-        if len(visited_waypoints) != len(self.waypoints):
-            to_visit = self.waypoints - visited_waypoints
-            path_lengths = self.dynamic_tsp(to_visit)
-            smallest_distance = min(path_lengths[wp] +
-                                    self.distance_maps[wp][y][x]
-                                    for wp in
-                                    self.waypoints - visited_waypoints)
+            cost = self.mst_costs[visited_waypoints] = dense_cost(weights)
 
-        else:
-            smallest_distance = self.goal_heuristics[y][x]
+        return cost
 
-        return smallest_distance
+    def heuristic_tsp(self, position, visited_waypoints: int):
+        if self.cell_distances is None:
+            self.prepare()
 
-    def dynamic_tsp(self, waypoints) -> Dict[Tuple[int, int], int]:
-        """
-        Calculates the minimal path from each way points to the goal, via all
-        the other waypoints.
-        """
+        if visited_waypoints != self.full_mask:
+            if self.tsp_table is None:
+                self.held_karp()
 
-        cache_key = tuple(sorted(waypoints))
-        if cache_key in self.shared_cache:
-            return self.shared_cache[cache_key]
+            n = len(self.ordered_waypoints)
+            offset = (self.full_mask ^ visited_waypoints) * n
+            distances = self.cell_distances[position]
+            smallest_distance = min(self.tsp_table[offset + wp] + distances[wp]
+                                    for wp in self.unvisited(visited_waypoints))
 
-        ordered_waypoints = list(waypoints)
-        n = len(ordered_waypoints)
-        all_indices = set(range(n))
+        else:
+            smallest_distance = self.goal_heuristics[position]
 
-        memory = {}
-        queue = Queue()
+        return smallest_distance
 
-        for index, wp in enumerate(ordered_waypoints):
-            key = (index,), index
-            wpx, wpy = wp
-            queue.put(key)
-            memory[key] = self.goal_heuristics[wpy][wpx], None
+    def held_karp(self):
+        """
+        Calculates for every subset of the waypoints the minimal path from
+        each of its waypoints to the goal, via all the others in the subset.
+        The table holds this at [subset * n + waypoint], for subset masks
+        with the same bits as the visited masks.
+        """
 
-        while not queue.empty():
-            prev_visited, prev_last_wp = queue.get()
-            prev_dist, _ = memory[(prev_visited, prev_last_wp)]
-            to_visit = all_indices.difference(set(prev_visited))
+        if self.cell_distances is None:
+            self.prepare()
 
-            for new_last_point in to_visit:
-                new_visited = tuple(sorted(prev_visited + (new_last_point,)))
-                xa, ya = ordered_waypoints[prev_last_wp]
-                wpb = ordered_waypoints[new_last_point]
-                new_dist = prev_dist + self.distance_maps[wpb][ya][xa]
+        n = len(self.ordered_waypoints)
+        table = array("i", bytes(4 * (n << n)))
 
-                new_key = new_visited, new_last_point
-                new_value = new_dist, prev_last_wp
+        for wp in range(n):
+            table[(1 << wp) * n + wp] = self.to_goal[wp]
 
-                if new_key not in memory:
-                    memory[new_key] = new_value
-                    queue.put(new_key)
-                else:
-                    if new_dist < memory[new_key][0]:
-                        memory[new_key] = new_value
+        # Subsets are built from smaller ones, which have lower masks
+        for subset in range(1, 1 << n):
+            waypoints = [wp for wp in range(n) if subset >> wp & 1]
+            if len(waypoints) == 1:
+                continue
 
-        result = {}
-        full_path = tuple(range(n))
-        for index, wp in enumerate(ordered_waypoints):
-            result[wp] = memory[(full_path, index)][0]
+            for first in waypoints:
+                rest_offset = (subset ^ (1 << first)) * n
+                distances = self.between[first]
+                table[subset * n + first] = min(
+                    distances[then] + table[rest_offset + then]
+                    for then in waypoints if then != first)
 
-        self.shared_cache[cache_key] = result
-        return result
+        self.tsp_table = table
 
     def is_waypoint(self, position):
         return position in self.waypoints
 
-    def is_next_waypoint(self, position, visited):
-        assert position not in visited
-        assert len(visited) < len(self.ordered_waypoints)
+    def is_next_waypoint(self, position, visited: int):
+        assert not visited & self.bits[position]
+        assert visited.bit_length() < len(self.ordered_waypoints)
 
-        return self.ordered_waypoints[len(visited)] == position
+        return self.ordered_waypoints[visited.bit_length()] == position
 
-    def are_all(self, waypoints: Set[Tuple[int, int]]):
+    def are_all(self, waypoints: int):
         """
-        Test whether the set of waypoints are all the waypoints there are in
+        Test whether the mask of waypoints are all the waypoints there are in
         this map.
 
         >>> from grid import Grid
@@ -172,20 +245,20 @@ class WaypointMap:
         >>> grid.add_agent((0, 0), (4, 4))
         >>> grid.add_waypoint(0, 4, 0)
         >>> grid.add_waypoint(0, 0, 4)
-        >>> m = WaypointMap(grid, (4, 4))
-        >>> m.add_waypoint(4, 0)
-        >>> m.add_waypoint(0, 4)
-        >>> m.are_all(set())
+        >>> m = WaypointMap(grid, grid.cell(4, 4))
+        >>> m.add_waypoint(grid.cell(4, 0))
+        >>> m.add_waypoint(grid.cell(0, 4))
+        >>> m.are_all(0)
         False
 
-        >>> m.are_all({(0, 4)})
+        >>> m.are_all(m.mask({grid.cell(0, 4)}))
         False
 
-        >>> m.are_all({(4, 0)})
+        >>> m.are_all(m.mask({grid.cell(4, 0)}))
         False
 
-        >>> m.are_all({(0, 4), (4, 0)})
+        >>> m.are_all(m.mask({grid.cell(0, 4), grid.cell(4, 0)}))
         True
         """
 
-        return all(wp in waypoints for wp in self.waypoints)
+        return waypoints == self.full_mask